@@ -1,73 +1,380 @@
 import json
-import tkinter as tk
-from tkinter import messagebox
-import tkinter.ttk as ttk
-
-transactions = []
+import os
+import queue
+import sys
+import threading
+from collections import namedtuple
+from itertools import compress, islice, repeat
+from operator import itemgetter
+
+import instrumentation
+from instrumentation import count, timed
+from storage import TRANSACTIONS_FILE, open_storage, write_json_rows
+from transaction_store import FIELDS, RowList, ordinal_to_date
+from validation import (normalize_transaction, parse_amount, parse_category, parse_date, parse_type, row_columns,
+                        validate_columns)
+
+# Tk is only imported when the GUI is launched; see import_tk().
+tk = messagebox = ttk = None
+
+IMPORT_BATCH_SIZE = 5000
+REPORTED_IMPORT_ERRORS = 10
+SORT_PAGE_SIZE = 500
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_POLL_MS = 20
+SEARCH_PAGE_SIZE = 200
+SEARCH_CHUNK_SIZE = 50
+SAVE_POLL_MS = 250
+# How long the CLI menu waits for a busy shared ledger before showing it as last loaded.
+REFRESH_TIMEOUT = 1.0
+SAVE_STATE_TEXT = {"saved": "All changes saved", "saving": "Saving...", "error": "Save failed, will retry"}
+STORAGE_PATH = os.environ.get("FINANCE_TRACKER_STORAGE", TRANSACTIONS_FILE)
+SHARED = os.environ.get("FINANCE_TRACKER_SHARED", "") not in ("", "0")
+SERVER_ADDRESS = os.environ.get("FINANCE_TRACKER_SERVER")
+
+Summary = namedtuple("Summary", "income expenses net categories months")
+
+storage = open_storage(STORAGE_PATH)
+transactions = storage.transactions
+
+def use_storage(path, shared=False):
+    global storage, transactions
+    storage = open_storage(path, shared)
+    transactions = storage.transactions
+
+def connect_server(address, ledger):
+    # Uses a ledger owned by a running "serve" process instead of a local file.
+    global storage, transactions
+    from server import RemoteStorage
+
+    storage = RemoteStorage(address, ledger)
+    transactions = storage.transactions
 
 def load_transactions():
-    try:
-        with open("transactions.json", "r") as file:
-            data = json.load(file)
-            global transactions
-            transactions = data.get("transactions", [])
-    except FileNotFoundError:
-        transactions = []
+    global transactions
+    storage.load()
+    transactions = storage.transactions
+    if storage.rejected:
+        print(f"{len(storage.rejected)} stored transaction(s) could not be read and were left out; "
+              f"they were copied to {storage.rejected_path}.")
+        print(describe_import_errors(storage.rejected))
 
 def save_transactions():
-    data = {"transactions": transactions}
-    with open("transactions.json", "w") as file:
-        json.dump(data, file)
+    storage.save()
 
-def read_bulk_transactions_from_file(filename):
-    try:
-        with open(filename, "r") as file:
-            data = json.load(file)
-            new_transactions = data.get("transactions", [])
-            global transactions
-            transactions.clear()
-            transactions.extend(new_transactions)
-        print("Bulk transactions read successfully and added.")
-    except FileNotFoundError:
-        print("File not found. No transactions were added.")
+def flush_transactions():
+    # Waits for edits still queued for the journal writer to reach disk.
+    storage.flush()
 
-def add_transaction():
-    amount = input("Enter the transaction amount: ")
-    while not amount.replace(".", "", 1).isdigit():
-        print("Invalid input. Please enter a valid amount.")
-        amount = input("Enter the transaction amount: ")
+def export_transactions(filename):
+    # Writes the ledger as {"transactions": [...]} JSON whatever the storage
+    # backend, in the same shape the bulk import reads.
+    with storage.lock:
+        write_json_rows(filename, transactions)
 
-    category = input("Enter the transaction category: ")
+def add_record(transaction):
+    storage.add(transaction)
 
-    type_ = input("Enter the transaction type (Income/Expense): ").lower()
-    while type_ not in ["income", "expense"]:
-        print("Invalid input. Please enter either 'Income' or 'Expense'.")
-        type_ = input("Enter the transaction type (Income/Expense): ").lower()
+def update_record(index, transaction):
+    storage.update(index, transaction)
 
-    date = input("Enter the transaction date (YYYY-MM-DD): ")
-    while len(date) != 10 or date[4] != "-" or date[7] != "-" or not date.replace("-", "").isdigit():
-        print("Invalid input. Please enter a valid date (YYYY-MM-DD).")
-        date = input("Enter the transaction date (YYYY-MM-DD): ")
+def delete_record(index):
+    storage.delete(index)
+
+def transaction_key(transaction):
+    return (round(transaction["amount"], 2), transaction["category"], transaction["type"], transaction["date"])
+
+def iter_json_lines(file, batch_size=IMPORT_BATCH_SIZE):
+    # Each batch of lines is decoded with a single json.loads call. If that
+    # fails, or does not give one value per line, the batch is decoded again
+    # line by line so a bad line raises its own error.
+    while True:
+        lines = list(islice(file, batch_size))
+        if not lines:
+            return
+        lines = [line for line in lines if not line.isspace()]
+        try:
+            rows = json.loads("[" + ",".join(lines) + "]")
+        except ValueError:
+            rows = None
+        if rows is None or len(rows) != len(lines):
+            rows = [json.loads(line) for line in lines]
+        yield from rows
+
+def iter_csv_columns(file, batch_size):
+    # Yields raw columns straight from csv.reader. As with csv.DictReader,
+    # blank lines are skipped and short rows read as None for the missing fields.
+    import csv
+
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    positions = {name: position for position, name in enumerate(header)}
 
-    transactions.append({
-        "amount": float(amount),
+    def split(batch):
+        return [list(map(itemgetter(positions[field]), batch)) if field in positions else [None] * len(batch)
+                for field in FIELDS]
+
+    while True:
+        chunk = list(islice(reader, batch_size))
+        if not chunk:
+            return
+        batch = list(filter(None, chunk))
+        try:
+            columns = split(batch)
+        except IndexError:
+            columns = split([row + [None] * (len(header) - len(row)) for row in batch])
+        yield columns
+
+def iter_row_columns(rows, batch_size):
+    # Same batches of raw columns for the JSON readers, which yield objects.
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield row_columns(batch)
+
+def iter_json_transactions(file, chunk_size=65536):
+    # Walks {"transactions": [...]} (or a bare list) one object at a time so
+    # only the current chunk is ever held in memory.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = file.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def peek():
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of file")
+        return buffer[pos]
+
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"Invalid file format: expected {char!r}")
+        pos += 1
+
+    def value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except ValueError as e:
+                if eof:
+                    # e's position is within the current chunk, not the file.
+                    raise ValueError(f"Invalid file format: {e.msg}") from None
+                fill()
+                continue
+            if end == len(buffer) and not eof:
+                # A number or literal may continue in the next chunk.
+                fill()
+                continue
+            pos = end
+            return obj
+
+    # Only the top-level "transactions" member is streamed; any other member
+    # is decoded whole and dropped.
+    if peek() == "{":
+        pos += 1
+        if peek() == "}":
+            return
+        while True:
+            key = value()
+            if not isinstance(key, str):
+                raise ValueError("Invalid file format: expected a key")
+            expect(":")
+            if key == "transactions":
+                break
+            value()
+            if peek() == "}":
+                return
+            expect(",")
+    expect("[")
+    if peek() == "]":
+        return
+    while True:
+        yield value()
+        char = peek()
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError("Invalid file format: expected ','")
+        pos += 1
+
+def is_ledger_file(filename):
+    # The open ledger's own snapshot or journal: importing it would read
+    # back a stale copy, and replace mode would drop the journaled edits.
+    target = os.path.realpath(filename)
+    paths = (getattr(storage, "path", None), getattr(storage, "journal_path", None))
+    return any(path and os.path.realpath(path) == target for path in paths)
+
+@timed("import", rows=lambda result: result[0])
+def import_transactions(filename, mode="append", batch_size=IMPORT_BATCH_SIZE, progress=None):
+    if mode not in ["append", "merge", "replace"]:
+        raise ValueError(f"Unknown import mode {mode!r}")
+    if is_ledger_file(filename):
+        raise ValueError(f"{filename} is the open ledger itself; export it to another file first")
+
+    lower_name = filename.lower()
+    if lower_name.endswith((".jsonl", ".ndjson")):
+        reader = lambda file: iter_row_columns(iter_json_lines(file, batch_size), batch_size)
+    elif lower_name.endswith(".csv"):
+        reader = lambda file: iter_csv_columns(file, batch_size)
+    else:
+        reader = lambda file: iter_row_columns(iter_json_transactions(file), batch_size)
+
+    added = skipped = rows = 0
+    errors = []
+    with open(filename, "r", newline="") as file:
+        total_bytes = os.fstat(file.fileno()).st_size
+
+        seen = None
+        if mode == "merge":
+            with storage.lock:
+                seen = {transaction_key(t) for t in transactions}
+
+        def validated():
+            nonlocal added, skipped, rows
+            for raw_columns in reader(file):
+                columns, batch_errors = validate_columns(*raw_columns)
+                errors.extend((rows + position + 1, message) for position, message in batch_errors)
+                rows += len(raw_columns[0])
+                valid = {"amount": columns["amount"].tolist(), "category": columns["category"],
+                         "type": columns["type"], "date": columns["date"]}
+                if seen is not None:
+                    keys = zip(map(round, valid["amount"], repeat(2)), valid["category"], valid["type"], valid["date"])
+                    unique = bytearray(len(valid["amount"]))
+                    for position, key in enumerate(keys):
+                        if key not in seen:
+                            seen.add(key)
+                            unique[position] = 1
+                    if not all(unique):
+                        valid = {field: list(compress(valid[field], unique)) for field in FIELDS}
+                    skipped += len(unique) - len(valid["amount"])
+                added += len(valid["amount"])
+                if progress:
+                    progress(rows, file.buffer.tell(), total_bytes)
+                if valid["amount"]:
+                    yield valid
+            if not rows and progress:
+                progress(rows, total_bytes, total_bytes)
+
+        if mode == "replace":
+            # The storage takes in the whole file before swapping it in, so a
+            # bad file or a crash leaves the old ledger as it was.
+            storage.replace_columns(validated())
+        else:
+            for valid in validated():
+                storage.extend_columns(valid)
+    return added, skipped, errors
+
+def describe_import_errors(errors):
+    lines = [f"Row {row}: {message}" for row, message in errors[:REPORTED_IMPORT_ERRORS]]
+    if len(errors) > REPORTED_IMPORT_ERRORS:
+        lines.append(f"... and {len(errors) - REPORTED_IMPORT_ERRORS} more")
+    return "\n".join(lines)
+
+def read_bulk_transactions_from_file(filename, mode="append"):
+    def report(rows, done, total):
+        percent = done * 100 // total if total else 100
+        print(f"  {rows} rows processed ({percent}%)")
+
+    try:
+        added, skipped, errors = import_transactions(filename, mode, progress=report)
+        print(f"Bulk transactions read successfully: {added} added, {skipped} duplicates skipped, {len(errors)} invalid.")
+        if errors:
+            print(describe_import_errors(errors))
+    except FileNotFoundError:
+        print("File not found. No transactions were added.")
+    except ValueError as e:
+        print(f"Failed to read file: {e}")
+
+def parse_indices(text, length):
+    # Turns "3" or "1,4-6" (1-based, as shown in the tables) into 0-based positions.
+    indices = set()
+    for part in text.replace(" ", "").split(","):
+        first, _, last = part.partition("-")
+        if not first.isdigit() or (last and not last.isdigit()):
+            raise ValueError(f"Invalid index {part!r}")
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= length:
+            raise ValueError(f"Index {part!r} out of range")
+        indices.update(range(first - 1, last))
+    return sorted(indices)
+
+def prompt_field(prompt, parse, error):
+    while True:
+        try:
+            return parse(input(prompt))
+        except ValueError:
+            print(error)
+
+def prompt_transaction(label):
+    amount = prompt_field(f"Enter the {label} amount: ", parse_amount,
+                          "Invalid input. Please enter a valid amount.")
+    category = input(f"Enter the {label} category: ").strip()
+    type_ = prompt_field(f"Enter the {label} type (Income/Expense): ", parse_type,
+                         "Invalid input. Please enter either 'Income' or 'Expense'.")
+    date = prompt_field(f"Enter the {label} date (YYYY-MM-DD): ", parse_date,
+                        "Invalid input. Please enter a valid date (YYYY-MM-DD).")
+    return {
+        "amount": amount,
         "category": category,
-        "type": type_.capitalize(),
-        "date": date
-    })
+        "type": type_,
+        "date": ordinal_to_date(date)
+    }
+
+def add_transaction():
+    add_record(prompt_transaction("transaction"))
     print("Transaction added successfully.")
 
+@timed("cli.view")
 def view_transactions():
     if not transactions:
         print("No transactions found.")
         return
-        
+    print_transaction_rows(transactions)
+    count("cli.view", len(transactions))
+
+def print_transaction_rows(rows):
     print(f"{'Index':<6} {'Amount':<10} {'Category':<15} {'Type':<10} {'Date':<12}")
     print("-" * 60)
 
-    for index, transaction in enumerate(transactions, start=1):
+    for index, transaction in enumerate(rows, start=1):
         print(f"{index:<6} Rs. {transaction['amount']:<8.2f} {transaction['category']:<15} {transaction['type']:<10} {transaction['date']:<12}")
 
+def search_transactions(text, amount_range="", date_range=""):
+    try:
+        found = transactions.text_search(text, amount_range, date_range)
+    except ValueError as e:
+        print(f"Invalid search: {e}")
+        return 1
+    if not found:
+        print("No matching transactions found.")
+        return 0
+    print_transaction_rows(found)
+    return 0
+
 def update_transaction():
     view_transactions()
     if not transactions:
@@ -76,12 +383,7 @@ def update_transaction():
 
     index = int(input("Enter the index of the transaction to update: "))
     if 1 <= index <= len(transactions):
-        transaction = transactions[index - 1]
-        transaction["amount"] = float(input("Enter the updated amount: "))
-        transaction["category"] = input("Enter the updated category: ")
-        transaction["type"] = input("Enter the updated type (Income/Expense): ").capitalize()
-        transaction["date"] = input("Enter the updated date (YYYY-MM-DD): ")
-        save_transactions()
+        update_record(index - 1, prompt_transaction("updated"))
         print("Transaction updated successfully.")
     else:
         print("Invalid index.")
@@ -92,32 +394,197 @@ def delete_transaction():
         print("No transactions to delete.")
         return
 
-    index = int(input("Enter the index of the transaction to delete: "))
-    if 1 <= index <= len(transactions):
-        del transactions[index - 1]
-        save_transactions()
-        print("Transaction deleted successfully.")
-    else:
+    try:
+        indices = parse_indices(input("Enter the index or indexes to delete (e.g. 3 or 1,4-6): "), len(transactions))
+    except ValueError:
+        print("Invalid index.")
+        return
+    with storage.batch() as batch:
+        batch.delete_many(indices)
+    print(f"{len(indices)} transaction(s) deleted successfully.")
+
+def recategorize_transactions():
+    view_transactions()
+    if not transactions:
+        print("No transactions to re-categorize.")
+        return
+
+    try:
+        indices = parse_indices(input("Enter the index or indexes to re-categorize (e.g. 3 or 1,4-6): "), len(transactions))
+    except ValueError:
         print("Invalid index.")
+        return
+    category = prompt_field("Enter the new category: ", parse_category,
+                            "Invalid input. Category cannot be empty.")
+    with storage.batch() as batch:
+        batch.recategorize(indices, category)
+    print(f"{len(indices)} transaction(s) re-categorized successfully.")
 
+@timed("summary.cli")
 def display_summary():
     if not transactions:
         print("No transactions to summarize.")
         return
 
-    income = sum(transaction["amount"] for transaction in transactions if transaction["type"] == "Income")
-    expenses = sum(transaction["amount"] for transaction in transactions if transaction["type"] == "Expense")
-    net_income = income - expenses
+    summary = summary_totals()
+
+    print(f"Total Income: {summary.income:.2f}")
+    print(f"Total Expenses: {summary.expenses:.2f}")
+    print(f"Net Income: {summary.net:.2f}")
+
+    for title, rows in (("Category", summary.categories), ("Month", summary.months)):
+        print_totals_table(title, rows)
+
+def summary_totals():
+    # A plain copy of the totals, so the cached value is not changed by later edits.
+    def compute():
+        summary = transactions.ensure_aggregates()
+        return Summary(summary.income, summary.expenses, summary.net, summary.category_totals(), summary.month_totals())
+
+    return storage.cached(("summary",), compute)
+
+def print_totals_table(title, rows):
+    print(f"\n{title:<15} {'Income':>12} {'Expenses':>12} {'Net':>12}")
+    print("-" * 54)
+    for name, income, expenses in rows:
+        print(f"{name:<15} {income:>12.2f} {expenses:>12.2f} {income - expenses:>12.2f}")
+
+def run_report(date_range="", window=None, workers=None):
+    from reporting import ROLLING_WINDOW, build_report
 
-    print(f"Total Income: {income:.2f}")
-    print(f"Total Expenses: {expenses:.2f}")
-    print(f"Net Income: {net_income:.2f}")
+    window = window or ROLLING_WINDOW
+    # The worker count only changes how fast a report is built, not what it holds.
+    return storage.cached(("report", date_range.strip(), window),
+                          lambda: build_report(transactions, date_range, window, workers, lock=storage.lock))
+
+def print_report(report):
+    print(f"Total Income: {report.income:.2f}")
+    print(f"Total Expenses: {report.expenses:.2f}")
+    print(f"Net Income: {report.net:.2f}")
+    print_totals_table("Month", report.month_totals())
+    print_totals_table("Category", report.category_totals())
+    print_totals_table(f"Rolling {report.window}m", report.rolling_totals())
+
+def show_report():
+    if not transactions:
+        print("No transactions to report.")
+        return
+
+    date_range = input("Enter the date range (e.g. 2024 or 2023-01..2024-06, blank for all): ").strip()
+    window = input("Enter the rolling window in months (default 3): ").strip()
+    try:
+        report = run_report(date_range, int(window) if window else None)
+    except ValueError as e:
+        print(f"Invalid report options: {e}")
+        return
+    print_report(report)
+
+class TransactionTable:
+    # Only the visible rows exist as Treeview items; scrolling rewrites their
+    # values from the store, so opening costs the same at any ledger size.
+    columns = ("Index", "Amount", "Category", "Type", "Date")
+
+    def __init__(self, master, rows, height=15, on_select=None, multiple=False, first_index=1):
+        self.frame = tk.Frame(master)
+        self.rows = rows
+        self.first_index = first_index
+        self.height = height
+        self.offset = 0
+        self.selected = set()
+        self.on_select = on_select
+        self.multiple = multiple
+
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.tree = ttk.Treeview(self.frame, columns=self.columns, show="headings", height=height,
+                                 selectmode="extended" if multiple else "browse")
+        for col in self.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, anchor="center", width=100)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.items = [self.tree.insert("", "end", values=()) for _ in range(height)]
+
+        self.tree.bind("<<TreeviewSelect>>", self.select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-1, "units"))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(1, "units"))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-1, "pages"))
+        self.tree.bind("<Next>", lambda e: self.scroll(1, "pages"))
+        self.refresh()
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    @timed("gui.table_refresh")
+    def refresh(self):
+        # A SQLite store shares its connection with the search thread.
+        with storage.lock:
+            total = len(self.rows)
+            self.offset = max(0, min(self.offset, total - self.height))
+            visible = self.rows[self.offset:self.offset + self.height]
+        selection = []
+        for slot, item in enumerate(self.items):
+            position = self.offset + slot
+            if slot < len(visible):
+                t = visible[slot]
+                self.tree.item(item, values=(position + self.first_index, t["amount"], t["category"], t["type"],
+                                             t["date"]))
+                if position in self.selected:
+                    selection.append(item)
+            else:
+                self.tree.item(item, values=())
+        self.tree.selection_set(selection)
+        count("gui.table_refresh", len(visible))
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.height) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def yview(self, action, value, unit=None):
+        if action == "moveto":
+            self.offset = int(float(value) * len(self.rows))
+            self.refresh()
+        else:
+            self.scroll(int(value), unit)
+
+    def scroll(self, count, unit):
+        self.offset += count * (self.height if unit == "pages" else 1)
+        self.refresh()
+        return "break"
+
+    def select(self, event=None):
+        # Tk only knows about the visible rows, so selections made on other
+        # pages are carried over from self.selected.
+        total = len(self.rows)
+        visible = set(range(self.offset, min(self.offset + self.height, total)))
+        chosen = {self.offset + self.items.index(item) for item in self.tree.selection()} & visible
+        if self.multiple:
+            selected = (self.selected - visible) | chosen
+        else:
+            selected = chosen or self.selected
+        if selected == self.selected:
+            return
+        self.selected = selected
+        if self.on_select:
+            self.on_select(sorted(selected) if self.multiple else min(selected))
+
+    def selected_positions(self):
+        return sorted(self.selected)
+
+def import_tk():
+    global tk, messagebox, ttk
+    import tkinter
+    from tkinter import messagebox as tk_messagebox
+    import tkinter.ttk as tk_ttk
+    tk, messagebox, ttk = tkinter, tk_messagebox, tk_ttk
 
 def launch_gui():
+    import_tk()
     root = tk.Tk()
     root.title("Personal Finance Tracker")
 
-    root.geometry("400x500")
+    root.geometry("400x645")
 
     def show_message(msg):
         messagebox.showinfo("Action", msg)
@@ -128,13 +595,32 @@ def launch_gui():
     tk.Button(root, text="View Transaction", width=30, command=open_view_transaction_window).pack(pady=5)
     tk.Button(root, text="Update Transaction", width=30, command=open_update_transaction_window).pack(pady=5)
     tk.Button(root, text="Delete Transaction", width=30, command=open_delete_transaction_window).pack(pady=5)
+    tk.Button(root, text="Bulk Re-categorize", width=30, command=open_recategorize_transactions_window).pack(pady=5)
     tk.Button(root, text="Display Summary", width=30, command=open_display_summary_window).pack(pady=5)
+    tk.Button(root, text="Reports", width=30, command=open_report_window).pack(pady=5)
     tk.Button(root, text="Read Bulk Transactions from File", width=30, command=open_read_bulk_transactions_window).pack(pady=5)
     tk.Button(root, text="Search Transactions", width=30, command=open_search_transaction_window).pack(pady=5)
     tk.Button(root, text="Sort Transactions (Ascending)", width=30, command=lambda: open_sorted_transactions_window("asc")).pack(pady=5)
     tk.Button(root, text="Sort Transactions (Descending)", width=30, command=lambda: open_sorted_transactions_window("desc")).pack(pady=5)
+    tk.Button(root, text="Diagnostics", width=30, command=open_diagnostics_window).pack(pady=5)
     tk.Button(root, text="Exit", width=30, command=lambda: exit_application(root), bg="red", fg="white").pack(pady=20)
-    
+
+    save_label = tk.Label(root, fg="gray")
+    save_label.pack()
+
+    def show_save_state():
+        root.after(SAVE_POLL_MS, show_save_state)
+        try:
+            # Never waits on another process; a busy ledger is caught up on a later poll.
+            storage.refresh(timeout=0)
+        except TimeoutError:
+            pass
+        except Exception as e:
+            save_label.config(text=f"Could not load changes from other processes: {e}")
+            return
+        save_label.config(text=SAVE_STATE_TEXT[storage.save_state()])
+
+    show_save_state()
     root.mainloop()
 
 def open_add_transaction_window():
@@ -159,28 +645,18 @@ def open_add_transaction_window():
     date_entry.pack()
 
     def save():
-        amount = amount_entry.get()
-        category = category_entry.get()
-        type_ = type_entry.get().lower()
-        date = date_entry.get()
-
-        if not amount.replace(".", "", 1).isdigit():
-            messagebox.showerror("Error", "Invalid amount")
-            return
-        if type_ not in ["income", "expense"]:
-            messagebox.showerror("Error", "Type must be 'Income' or 'Expense'")
-            return
-        if len(date) != 10 or date[4] != "-" or date[7] != "-" or not date.replace("-", "").isdigit():
-            messagebox.showerror("Error", "Date must be in YYYY-MM-DD format")
+        try:
+            transaction = normalize_transaction({
+                "amount": amount_entry.get(),
+                "category": category_entry.get(),
+                "type": type_entry.get(),
+                "date": date_entry.get()
+            })
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
 
-        transactions.append({
-            "amount": float(amount),
-            "category": category,
-            "type": type_.capitalize(),
-            "date": date
-        })
-        save_transactions()
+        add_record(transaction)
         messagebox.showinfo("Success", "Transaction added successfully")
         add_win.destroy()
 
@@ -193,24 +669,7 @@ def open_view_transaction_window():
 
     tk.Label(view_win, text="All Transactions", font=("Helvetica", 14, "bold")).pack(pady=10)
 
-    tree_frame = tk.Frame(view_win)
-    tree_frame.pack(pady=10, fill="both", expand=True)
-
-    scrollbar = tk.Scrollbar(tree_frame)
-    scrollbar.pack(side="right", fill="y")
-
-    columns = ("Index", "Amount", "Category", "Type", "Date")
-    tree = ttk.Treeview(tree_frame, columns=columns, show="headings", yscrollcommand=scrollbar.set)
-
-    for col in columns:
-        tree.heading(col, text=col)
-        tree.column(col, anchor="center", width=100)
-
-    for idx, t in enumerate(transactions, start=1):
-        tree.insert("", "end", values=(idx, t["amount"], t["category"], t["type"], t["date"]))
-
-    tree.pack(fill="both", expand=True)
-    scrollbar.config(command=tree.yview)
+    TransactionTable(view_win, transactions).pack(pady=10, fill="both", expand=True)
 
 def open_update_transaction_window():
     update_win = tk.Toplevel()
@@ -219,28 +678,19 @@ def open_update_transaction_window():
 
     tk.Label(update_win, text="All Transactions", font=("Helvetica", 12, "bold")).pack(pady=5)
 
-    tree_frame = tk.Frame(update_win)
-    tree_frame.pack(pady=10)
-
-    columns = ("#1", "#2", "#3", "#4", "#5")
-    tree = ttk.Treeview(tree_frame, columns=columns, show="headings", height=8)
-    tree.pack(side="left", fill="x")
-
-    for col, heading in zip(columns, ["Index", "Amount", "Category", "Type", "Date"]):
-        tree.heading(col, text=heading)
-        tree.column(col, width=100)
-
-    for idx, t in enumerate(transactions, start=1):
-        tree.insert("", "end", values=(idx, t["amount"], t["category"], t["type"], t["date"]))
-
-    scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-    tree.configure(yscrollcommand=scrollbar.set)
-    scrollbar.pack(side="right", fill="y")
+    table_frame = tk.Frame(update_win)
+    table_frame.pack(pady=10)
 
     tk.Label(update_win, text="Enter Index to Update").pack()
     index_entry = tk.Entry(update_win)
     index_entry.pack()
 
+    def select_index(position):
+        index_entry.delete(0, tk.END)
+        index_entry.insert(0, str(position + 1))
+
+    TransactionTable(table_frame, transactions, height=8, on_select=select_index).pack()
+
     tk.Label(update_win, text="New Amount").pack()
     amount_entry = tk.Entry(update_win)
     amount_entry.pack()
@@ -263,28 +713,18 @@ def open_update_transaction_window():
             messagebox.showerror("Error", "Invalid index")
             return
 
-        amount = amount_entry.get()
-        category = category_entry.get()
-        type_ = type_entry.get().lower()
-        date = date_entry.get()
-
-        if not amount.replace(".", "", 1).isdigit():
-            messagebox.showerror("Error", "Invalid amount")
-            return
-        if type_ not in ["income", "expense"]:
-            messagebox.showerror("Error", "Type must be 'Income' or 'Expense'")
-            return
-        if len(date) != 10 or date[4] != "-" or date[7] != "-" or not date.replace("-", "").isdigit():
-            messagebox.showerror("Error", "Date must be in YYYY-MM-DD format")
+        try:
+            transaction = normalize_transaction({
+                "amount": amount_entry.get(),
+                "category": category_entry.get(),
+                "type": type_entry.get(),
+                "date": date_entry.get()
+            })
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
 
-        transactions[int(idx) - 1] = {
-            "amount": float(amount),
-            "category": category,
-            "type": type_.capitalize(),
-            "date": date
-        }
-        save_transactions()
+        update_record(int(idx) - 1, transaction)
         messagebox.showinfo("Success", "Transaction updated successfully")
         update_win.destroy()
 
@@ -297,106 +737,246 @@ def open_delete_transaction_window():
 
     tk.Label(del_win, text="All Transactions", font=("Helvetica", 12, "bold")).pack(pady=5)
 
-    tree_frame = tk.Frame(del_win)
-    tree_frame.pack(pady=10)
+    table_frame = tk.Frame(del_win)
+    table_frame.pack(pady=10)
 
-    columns = ("#1", "#2", "#3", "#4", "#5")
-    tree = ttk.Treeview(tree_frame, columns=columns, show="headings", height=8)
-    tree.pack(side="left", fill="x")
+    tk.Label(del_win, text="Select rows or enter indexes to delete (e.g. 3 or 1,4-6)").pack(pady=5)
+    index_entry = tk.Entry(del_win)
+    index_entry.pack()
 
-    for col, heading in zip(columns, ["Index", "Amount", "Category", "Type", "Date"]):
-        tree.heading(col, text=heading)
-        tree.column(col, width=100)
+    def select_indices(positions):
+        index_entry.delete(0, tk.END)
+        index_entry.insert(0, ",".join(str(position + 1) for position in positions))
 
-    for idx, t in enumerate(transactions, start=1):
-        tree.insert("", "end", values=(idx, t["amount"], t["category"], t["type"], t["date"]))
+    TransactionTable(table_frame, transactions, height=8, on_select=select_indices, multiple=True).pack()
 
-    scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-    tree.configure(yscrollcommand=scrollbar.set)
-    scrollbar.pack(side="right", fill="y")
+    def delete():
+        try:
+            indices = parse_indices(index_entry.get(), len(transactions))
+        except ValueError:
+            messagebox.showerror("Error", "Invalid index")
+            return
+        with storage.batch() as batch:
+            batch.delete_many(indices)
+        messagebox.showinfo("Success", f"{len(indices)} transaction(s) deleted successfully")
+        del_win.destroy()
 
-    tk.Label(del_win, text="Enter Index to Delete").pack(pady=5)
-    index_entry = tk.Entry(del_win)
+    tk.Button(del_win, text="Delete Selected", command=delete, bg="red", fg="white").pack(pady=10)
+
+def open_recategorize_transactions_window():
+    cat_win = tk.Toplevel()
+    cat_win.title("Bulk Re-categorize")
+    cat_win.geometry("600x500")
+
+    tk.Label(cat_win, text="All Transactions", font=("Helvetica", 12, "bold")).pack(pady=5)
+
+    table_frame = tk.Frame(cat_win)
+    table_frame.pack(pady=10)
+
+    tk.Label(cat_win, text="Select rows or enter indexes (e.g. 3 or 1,4-6)").pack(pady=5)
+    index_entry = tk.Entry(cat_win)
     index_entry.pack()
 
-    def delete():
-        idx = index_entry.get()
-        if not idx.isdigit() or not (1 <= int(idx) <= len(transactions)):
+    tk.Label(cat_win, text="New Category").pack(pady=5)
+    category_entry = tk.Entry(cat_win)
+    category_entry.pack()
+
+    def select_indices(positions):
+        index_entry.delete(0, tk.END)
+        index_entry.insert(0, ",".join(str(position + 1) for position in positions))
+
+    TransactionTable(table_frame, transactions, height=8, on_select=select_indices, multiple=True).pack()
+
+    def recategorize():
+        try:
+            indices = parse_indices(index_entry.get(), len(transactions))
+        except ValueError:
             messagebox.showerror("Error", "Invalid index")
             return
-        transactions.pop(int(idx) - 1)
-        save_transactions()
-        messagebox.showinfo("Success", "Transaction deleted successfully")
-        del_win.destroy()
+        try:
+            category = parse_category(category_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        with storage.batch() as batch:
+            batch.recategorize(indices, category)
+        messagebox.showinfo("Success", f"{len(indices)} transaction(s) re-categorized successfully")
+        cat_win.destroy()
 
-    tk.Button(del_win, text="Delete", command=delete, bg="red", fg="white").pack(pady=10)
+    tk.Button(cat_win, text="Re-categorize Selected", command=recategorize).pack(pady=10)
 
+@timed("summary.gui")
 def open_display_summary_window():
     if not transactions:
         messagebox.showinfo("Summary", "No transactions to summarize.")
         return
 
-    income = sum(transaction["amount"] for transaction in transactions if transaction["type"] == "Income")
-    expenses = sum(transaction["amount"] for transaction in transactions if transaction["type"] == "Expense")
-    net_income = income - expenses
+    summary = summary_totals()
 
     summary_win = tk.Toplevel()
     summary_win.title("Transaction Summary")
-    summary_win.geometry("300x200")
+    summary_win.geometry("450x500")
 
     tk.Label(summary_win, text="Summary", font=("Helvetica", 14, "bold")).pack(pady=10)
-    tk.Label(summary_win, text=f"Total Income: Rs. {income:.2f}").pack(pady=5)
-    tk.Label(summary_win, text=f"Total Expenses: Rs. {expenses:.2f}").pack(pady=5)
-    tk.Label(summary_win, text=f"Net Income: Rs. {net_income:.2f}").pack(pady=5)
+    tk.Label(summary_win, text=f"Total Income: Rs. {summary.income:.2f}").pack(pady=5)
+    tk.Label(summary_win, text=f"Total Expenses: Rs. {summary.expenses:.2f}").pack(pady=5)
+    tk.Label(summary_win, text=f"Net Income: Rs. {summary.net:.2f}").pack(pady=5)
+
+    for title, rows in (("Category", summary.categories), ("Month", summary.months)):
+        tk.Label(summary_win, text=f"By {title}", font=("Helvetica", 11, "bold")).pack(pady=(10, 0))
+        columns = (title, "Income", "Expenses", "Net")
+        tree = ttk.Treeview(summary_win, columns=columns, show="headings", height=5)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, anchor="center", width=100)
+        for name, income, expenses in rows:
+            tree.insert("", "end", values=(name, f"{income:.2f}", f"{expenses:.2f}", f"{income - expenses:.2f}"))
+        tree.pack(fill="x", padx=10)
+
+def open_report_window():
+    report_win = tk.Toplevel()
+    report_win.title("Reports")
+    report_win.geometry("520x560")
+
+    options = tk.Frame(report_win)
+    options.pack(pady=10)
+    tk.Label(options, text="Date range").grid(row=0, column=0, sticky="w")
+    range_entry = tk.Entry(options)
+    range_entry.grid(row=0, column=1, padx=5)
+    tk.Label(options, text="Rolling window (months)").grid(row=1, column=0, sticky="w")
+    window_entry = tk.Entry(options)
+    window_entry.insert(0, "3")
+    window_entry.grid(row=1, column=1, padx=5)
+
+    status_label = tk.Label(report_win, text="Leave the date range blank to report on everything.")
+    status_label.pack()
+
+    tabs = ttk.Notebook(report_win)
+    tabs.pack(fill="both", expand=True, padx=10, pady=10)
+    trees = {}
+    for title in ("Month", "Category", "Rolling"):
+        columns = (title, "Income", "Expenses", "Net")
+        tree = ttk.Treeview(tabs, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, anchor="center", width=110)
+        tabs.add(tree, text=title)
+        trees[title] = tree
+
+    results = queue.Queue()
+    running = False
+
+    def report_worker(date_range, window):
+        try:
+            results.put(run_report(date_range, window))
+        except ValueError as e:
+            results.put(e)
+
+    def poll_report():
+        nonlocal running
+        try:
+            report = results.get_nowait()
+        except queue.Empty:
+            report_win.after(SEARCH_POLL_MS, poll_report)
+            return
+        running = False
+        run_button.config(state="normal")
+        if isinstance(report, Exception):
+            status_label.config(text="")
+            messagebox.showerror("Error", str(report))
+            return
+        status_label.config(text=f"Income: Rs. {report.income:.2f}   Expenses: Rs. {report.expenses:.2f}   "
+                                 f"Net: Rs. {report.net:.2f}")
+        tabs.tab(2, text=f"Rolling {report.window}m")
+        for title, rows in (("Month", report.month_totals()), ("Category", report.category_totals()),
+                            ("Rolling", report.rolling_totals())):
+            tree = trees[title]
+            tree.delete(*tree.get_children())
+            for name, income, expenses in rows:
+                tree.insert("", "end", values=(name, f"{income:.2f}", f"{expenses:.2f}", f"{income - expenses:.2f}"))
+
+    def run():
+        nonlocal running
+        if running:
+            return
+        window = window_entry.get().strip()
+        if not window.isdigit() or int(window) < 1:
+            messagebox.showerror("Error", "Rolling window must be a whole number of months")
+            return
+        running = True
+        run_button.config(state="disabled")
+        status_label.config(text="Building report...")
+        threading.Thread(target=report_worker, args=(range_entry.get(), int(window)), daemon=True).start()
+        report_win.after(SEARCH_POLL_MS, poll_report)
+
+    run_button = tk.Button(options, text="Run Report", command=run)
+    run_button.grid(row=2, column=0, columnspan=2, pady=5)
 
 def open_read_bulk_transactions_window():
     bulk_win = tk.Toplevel()
     bulk_win.title("Load Bulk Transactions")
-    bulk_win.geometry("300x150")
+    bulk_win.geometry("300x260")
+
+    tk.Label(bulk_win, text="File (.json, .jsonl or .csv)").pack(pady=5)
+    file_entry = tk.Entry(bulk_win, width=30)
+    file_entry.pack()
+
+    tk.Label(bulk_win, text="Import Mode:").pack(pady=5)
+    mode_var = tk.StringVar(value="append")
+    tk.OptionMenu(bulk_win, mode_var, "append", "merge", "replace").pack()
+
+    progress_label = tk.Label(bulk_win, text="")
+    progress_label.pack(pady=5)
+
+    def report(rows, done, total):
+        percent = done * 100 // total if total else 100
+        progress_label.config(text=f"{rows} rows processed ({percent}%)")
+        bulk_win.update_idletasks()
 
     def load_bulk():
+        filename = file_entry.get().strip()
+        if not filename:
+            messagebox.showerror("Error", "Enter the file to read.")
+            return
+        if mode_var.get() == "replace" and not messagebox.askyesno(
+                "Replace Ledger", f"Replace every transaction in the ledger with the rows in {filename}?"):
+            return
+        # Appended and merged rows land after the current end; a replace starts over.
+        with storage.lock:
+            start = 0 if mode_var.get() == "replace" else len(transactions)
         try:
-            with open("transactions.json", "r") as file:
-                data = json.load(file)
-                if isinstance(data, dict) and "transactions" in data:
-                    transactions.clear()
-                    transactions.extend(data["transactions"])
-                    save_transactions()
-                    messagebox.showinfo("Success", "Transactions loaded successfully")
-                    bulk_win.destroy()
-                    show_transactions_from_file_window()
-                    
-                else:
-                    messagebox.showerror("Error", "Invalid file format")
+            added, skipped, errors = import_transactions(filename, mode_var.get(), progress=report)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load file: {str(e)}")
             bulk_win.destroy()
+            return
+        bulk_win.destroy()
+        show_transactions_from_file_window(start, added, skipped, errors)
 
-    tk.Label(bulk_win, text="Load all transactions from file?").pack(pady=10)
+    tk.Label(bulk_win, text="Load transactions from file?").pack(pady=5)
     tk.Button(bulk_win, text="Load", command=load_bulk).pack()
 
-def show_transactions_from_file_window():
+def show_transactions_from_file_window(start, added, skipped, errors):
     view_win = tk.Toplevel()
     view_win.title("Transactions from File")
-    view_win.geometry("550x400")
+    view_win.geometry("550x500" if errors else "550x400")
 
     tk.Label(view_win, text="Transactions from File", font=("Helvetica", 14, "bold")).pack(pady=10)
+    tk.Label(view_win, text=f"{added} added, {skipped} duplicates skipped, {len(errors)} invalid").pack()
 
-    columns = ("Index", "Amount", "Category", "Type", "Date")
-    tree = ttk.Treeview(view_win, columns=columns, show="headings")
-    for col in columns:
-        tree.heading(col, text=col)
-        tree.column(col, width=100)
-
-    for idx, t in enumerate(transactions, start=1):
-        tree.insert("", tk.END, values=(idx, t["amount"], t["category"], t["type"], t["date"]))
+    if errors:
+        error_text = tk.Text(view_win, height=6, width=60)
+        error_text.insert("1.0", describe_import_errors(errors))
+        error_text.config(state="disabled")
+        error_text.pack(pady=5)
 
-    tree.pack(fill="both", expand=True)
+    rows = RowList(transactions, range(start, start + added))
+    TransactionTable(view_win, rows, first_index=start + 1).pack(fill="both", expand=True)
 
 def open_search_transaction_window():
     search_win = tk.Toplevel()
     search_win.title("Search Transactions")
-    search_win.geometry("400x400")
+    search_win.geometry("400x520")
 
     tk.Label(search_win, text="Search Transactions", font=("Helvetica", 14, "bold")).pack(pady=10)
 
@@ -407,9 +987,25 @@ def open_search_transaction_window():
     field_menu.pack(pady=5)
 
     tk.Label(search_win, text="Enter Search Value:").pack()
+    tk.Label(search_win, text="Dates: YYYY-MM-DD, YYYY-MM, YYYY or a range like 2024-01..2024-03",
+             font=("Helvetica", 8)).pack()
     search_entry = tk.Entry(search_win)
     search_entry.pack(pady=5)
 
+    # Category searches match partial and misspelled names, best match first,
+    # and can be narrowed by amount and date.
+    filters = tk.Frame(search_win)
+    filters.pack(pady=5)
+    tk.Label(filters, text="Amount (e.g. 10..50)").grid(row=0, column=0, sticky="w")
+    amount_entry = tk.Entry(filters, width=15)
+    amount_entry.grid(row=0, column=1, padx=5)
+    tk.Label(filters, text="Date range").grid(row=1, column=0, sticky="w")
+    date_entry = tk.Entry(filters, width=15)
+    date_entry.grid(row=1, column=1, padx=5)
+
+    more_button = tk.Button(search_win, text="Show More", state="disabled")
+    more_button.pack(side="bottom", pady=5)
+
     result_frame = tk.Frame(search_win)
     result_frame.pack(pady=10, fill="both", expand=True)
 
@@ -420,41 +1016,125 @@ def open_search_transaction_window():
     scrollbar.pack(side="right", fill="y")
     result_text.config(yscrollcommand=scrollbar.set)
 
-    def search(*args):
-        field = field_var.get()
-        value = search_entry.get().strip().lower()
+    results = queue.Queue()
+    pending = None
+    polling = False
+    generation = 0
+    searching = 0
+    matches = []
+    shown = 0
+    page_end = 0
 
+    def search_worker(query, field, value, amount_range, date_range):
+        try:
+            with storage.lock:
+                if field == "category":
+                    found = storage.cached(("text_search", value, amount_range, date_range),
+                                           lambda: transactions.text_search(value, amount_range, date_range))
+                else:
+                    found = storage.cached(("search", field, value), lambda: transactions.search(field, value))
+        except ValueError as e:
+            found = e
+        results.put((query, found))
+
+    def search(*args):
+        nonlocal pending, generation, polling, searching
+        pending = None
+        generation += 1
+        more_button.config(state="disabled")
         result_text.delete("1.0", tk.END)
 
-        if not value:
+        field = field_var.get()
+        value = search_entry.get().strip().lower()
+        amount_range = amount_entry.get().strip()
+        date_range = date_entry.get().strip()
+        if not value and not (field == "category" and (amount_range or date_range)):
             result_text.insert(tk.END, "Please enter a search value.")
             return
 
-        matches = []
-        for t in transactions:
-            if field == "category" and t["category"].lower() == value:
-                matches.append(t)
-            elif field == "type" and t["type"].lower() == value:
-                matches.append(t)
-            elif field == "date" and t["date"] == value:
-                matches.append(t)
+        result_text.insert(tk.END, "Searching...")
+        searching = generation
+        threading.Thread(target=search_worker, args=(generation, field, value, amount_range, date_range),
+                         daemon=True).start()
+        if not polling:
+            polling = True
+            search_win.after(SEARCH_POLL_MS, poll_results)
+
+    def schedule_search(*args):
+        # Debounce: only the last keystroke in a burst starts a search.
+        nonlocal pending
+        if pending is not None:
+            search_win.after_cancel(pending)
+        pending = search_win.after(SEARCH_DEBOUNCE_MS, search)
+
+    def poll_results():
+        nonlocal polling, matches, shown, page_end
+        if not search_win.winfo_exists():
+            return
+        latest = None
+        while not results.empty():
+            query, found = results.get_nowait()
+            if query == generation:
+                latest = found
+        if latest is None:
+            if searching == generation:
+                search_win.after(SEARCH_POLL_MS, poll_results)
+            else:
+                polling = False
+            return
 
+        polling = False
+        result_text.delete("1.0", tk.END)
+        if isinstance(latest, ValueError):
+            matches = []
+            result_text.insert(tk.END, str(latest))
+            return
+        matches = latest
+        shown = 0
+        page_end = 0
         if matches:
-            for idx, t in enumerate(matches, start=1):
-                result_text.insert(tk.END,
-                    f"{idx}. Amount: Rs. {t['amount']}, Category: {t['category']}, "
-                    f"Type: {t['type']}, Date: {t['date']}\n\n")
+            show_more()
         else:
             result_text.insert(tk.END, "No matching transactions found.")
 
-    search_entry.bind("<KeyRelease>", search)
+    @timed("gui.search_render")
+    def render_chunk(query):
+        nonlocal shown
+        if query != generation or not search_win.winfo_exists():
+            return
+        end = min(shown + SEARCH_CHUNK_SIZE, page_end)
+        lines = []
+        for idx, t in enumerate(matches[shown:end], start=shown):
+            lines.append(f"{idx + 1}. Amount: Rs. {t['amount']}, Category: {t['category']}, "
+                         f"Type: {t['type']}, Date: {t['date']}\n\n")
+        result_text.insert(tk.END, "".join(lines))
+        count("gui.search_render", len(lines))
+        shown = end
+        if shown < page_end:
+            search_win.after(1, render_chunk, query)
+        else:
+            more_button.config(state="normal" if shown < len(matches) else "disabled")
+
+    def show_more():
+        nonlocal page_end
+        page_end = min(page_end + SEARCH_PAGE_SIZE, len(matches))
+        more_button.config(state="disabled")
+        render_chunk(generation)
+
+    more_button.config(command=show_more)
+    field_var.trace_add("write", schedule_search)
+    for entry in (search_entry, amount_entry, date_entry):
+        entry.bind("<KeyRelease>", schedule_search)
 
 def open_sorted_transactions_window(order="asc"):
     sort_win = tk.Toplevel()
     sort_win.title(f"Transactions Sorted ({'Ascending' if order == 'asc' else 'Descending'})")
-    sort_win.geometry("400x400")
+    sort_win.geometry("400x450")
 
-    sorted_txns = sorted(transactions, key=lambda x: x["amount"], reverse=(order == "desc"))
+    controls = tk.Frame(sort_win)
+    controls.pack(pady=5)
+    tk.Label(controls, text="Sort By:").pack(side="left")
+    field_var = tk.StringVar(value="amount")
 
     result_frame = tk.Frame(sort_win)
     result_frame.pack(pady=10, fill="both", expand=True)
@@ -466,22 +1146,103 @@ def open_sorted_transactions_window(order="asc"):
     scrollbar.pack(side="right", fill="y")
     result_text.config(yscrollcommand=scrollbar.set)
 
-    if sorted_txns:
-        for idx, t in enumerate(sorted_txns, start=1):
-            result_text.insert(tk.END,
-                f"{idx}. Amount: Rs. {t['amount']}, Category: {t['category']}, "
-                f"Type: {t['type']}, Date: {t['date']}\n\n")
-    else:
-        result_text.insert(tk.END, "No transactions found.")
+    shown = 0
+
+    @timed("gui.sort_page")
+    def show_more():
+        nonlocal shown
+        field, reverse = field_var.get(), order == "desc"
+        view = storage.cached(("sorted", field, reverse), lambda: transactions.sorted_view(field, reverse))
+        end = min(shown + SORT_PAGE_SIZE, len(view))
+        lines = []
+        for idx, t in enumerate(view[shown:end], start=shown):
+            lines.append(f"{idx + 1}. Amount: Rs. {t['amount']}, Category: {t['category']}, "
+                         f"Type: {t['type']}, Date: {t['date']}\n\n")
+        result_text.insert(tk.END, "".join(lines))
+        count("gui.sort_page", len(lines))
+        shown = end
+        more_button.config(state="normal" if shown < len(view) else "disabled")
+
+    def render(*args):
+        nonlocal shown
+        shown = 0
+        result_text.delete("1.0", tk.END)
+        if transactions:
+            show_more()
+        else:
+            result_text.insert(tk.END, "No transactions found.")
+            more_button.config(state="disabled")
+
+    tk.OptionMenu(controls, field_var, "amount", "date", "category", command=render).pack(side="left")
+    more_button = tk.Button(sort_win, text="Show More", command=show_more)
+    more_button.pack(pady=5)
+    render()
+
+def open_diagnostics_window():
+    diag_win = tk.Toplevel()
+    diag_win.title("Diagnostics")
+    diag_win.geometry("760x430")
+
+    cache = storage.queries.stats()
+    tk.Label(diag_win, text=f"Query cache: {cache['entries']}/{cache['max_entries']} entries, {cache['hits']} hits, "
+                            f"{cache['misses']} misses ({cache['hit_rate']:.0%}), {cache['stale']} invalidated, "
+                            f"{cache['evictions']} evicted").pack(pady=(10, 0))
+
+    if not instrumentation.ENABLED:
+        tk.Label(diag_win, text="Instrumentation is off.\n"
+                                "Start with --profile or set FINANCE_TRACKER_PROFILE=1 to collect timings.").pack(pady=20)
+        return
+
+    tk.Label(diag_win, text=f"Diagnostics ({instrumentation.MODE})", font=("Helvetica", 14, "bold")).pack(pady=10)
+
+    columns = ("Operation", "Calls", "p50 ms", "p99 ms", "Total ms", "Rows", "Bytes")
+    tree = ttk.Treeview(diag_win, columns=columns, show="headings", height=12)
+    for col in columns:
+        tree.heading(col, text=col)
+        tree.column(col, anchor="w" if col == "Operation" else "e", width=160 if col == "Operation" else 90)
+    tree.pack(fill="both", expand=True, padx=10)
+
+    def refresh():
+        tree.delete(*tree.get_children())
+        for name, metric in instrumentation.stats().items():
+            tree.insert("", "end", values=(name, metric["calls"], f"{metric['p50_ms']:.2f}", f"{metric['p99_ms']:.2f}",
+                                           f"{metric['total_ms']:.1f}", metric["rows"], metric["bytes_written"]))
+
+    def save():
+        try:
+            path = instrumentation.dump(extra={"query_cache": storage.queries.stats()})
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write stats: {e}")
+            return
+        messagebox.showinfo("Diagnostics", f"Stats written to {path}")
+
+    buttons = tk.Frame(diag_win)
+    buttons.pack(pady=10)
+    tk.Button(buttons, text="Refresh", command=refresh).pack(side="left", padx=5)
+    tk.Button(buttons, text="Save JSON", command=save).pack(side="left", padx=5)
+    refresh()
 
 def exit_application(root):
     result = messagebox.askyesno("Exit", "Are you sure you want to exit?")
     if result:
+        try:
+            flush_transactions()
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save changes: {e}")
+            return
         root.destroy()
 
+def refresh_ledger():
+    try:
+        storage.refresh(timeout=REFRESH_TIMEOUT)
+    except TimeoutError:
+        print("The ledger is busy in another process; showing it as last loaded.")
+    except Exception as e:
+        print(f"Could not load changes from other processes: {e}")
+
 def main_menu():
-    load_transactions()
     while True:
+        refresh_ledger()
         print("\nPersonal Finance Tracker")
         print("1. Add Transaction")
         print("2. View Transactions")
@@ -489,7 +1250,9 @@ def main_menu():
         print("4. Delete Transaction")
         print("5. Display Summary")
         print("6. Read Bulk Transactions from File")
-        print("7. Exit")
+        print("7. Bulk Re-categorize Transactions")
+        print("8. Reports")
+        print("9. Exit")
 
         choice = input("Enter your choice: ")
         if choice == "1":
@@ -503,25 +1266,159 @@ def main_menu():
         elif choice == "5":
             display_summary()
         elif choice == "6":
-            read_bulk_transactions_from_file("transactions.json")
+            filename = input("Enter the file to read: ").strip()
+            mode = input("Import mode (append/merge/replace, default append): ").strip().lower() or "append"
+            if not filename:
+                print("No file given. No transactions were added.")
+            elif mode != "replace" or input(f"Replace every transaction with the rows in {filename}? (y/n): ").strip().lower() == "y":
+                read_bulk_transactions_from_file(filename, mode)
         elif choice == "7":
-            save_transactions()
+            recategorize_transactions()
+        elif choice == "8":
+            show_report()
+        elif choice == "9":
+            flush_transactions()
             print("Exiting...")
             break
         else:
-            print("Invalid choice. Please enter a number from 1 to 7.")
+            print("Invalid choice. Please enter a number from 1 to 9.")
 
-if __name__ == "__main__":
-    load_transactions()
-
-    print("\nLaunch Mode:")
-    print("1. CLI Mode (Console)")
-    print("2. GUI Mode (Window)")
-    choice = input("Enter your choice (1 or 2): ")
-
-    if choice == "1":
+def add_from_arguments(args):
+    try:
+        transaction = normalize_transaction(vars(args))
+    except ValueError as e:
+        print(f"Invalid transaction: {e}")
+        return 1
+    add_record(transaction)
+    print("Transaction added successfully.")
+    return 0
+
+def parse_arguments(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Personal Finance Tracker")
+    parser.add_argument("--storage", default=STORAGE_PATH,
+                        help="ledger file; .db/.sqlite/.sqlite3 selects the SQLite backend")
+    parser.add_argument("--shared", action="store_true", default=SHARED,
+                        help="lock the ledger file per change so several processes can edit it at once")
+    parser.add_argument("--server", default=SERVER_ADDRESS, metavar="ADDRESS",
+                        help="use a ledger served by 'serve' at ADDRESS (socket path or host:port)")
+    parser.add_argument("--ledger", default="default", help="ledger name on the server (default: default)")
+    parser.add_argument("--profile", choices=instrumentation.MODES,
+                        help="collect timings (plus a cProfile or tracemalloc capture) and write them out on exit")
+    parser.add_argument("--profile-output", help=f"where to write the stats (default {instrumentation.PROFILE_OUTPUT})")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("cli", help="open the interactive CLI menu")
+    commands.add_parser("gui", help="open the GUI")
+    commands.add_parser("view", help="print all transactions")
+    commands.add_parser("summary", help="print the income/expense summary")
+    add_parser = commands.add_parser("add", help="add one transaction")
+    add_parser.add_argument("--amount", required=True)
+    add_parser.add_argument("--category", required=True)
+    add_parser.add_argument("--type", required=True, choices=["income", "expense", "Income", "Expense"])
+    add_parser.add_argument("--date", required=True, help="YYYY-MM-DD")
+    import_parser = commands.add_parser("import", help="import a .json, .jsonl or .csv file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--mode", default="append", choices=["append", "merge", "replace"])
+    search_parser = commands.add_parser("search", help="find transactions by partial or misspelled category")
+    search_parser.add_argument("text", nargs="?", default="")
+    search_parser.add_argument("--amount", default="", help="e.g. 25, 10..50 or 100..")
+    search_parser.add_argument("--date", default="", help="e.g. 2024 or 2023-01..2024-06")
+    export_parser = commands.add_parser("export", help="write the ledger to a JSON file")
+    export_parser.add_argument("file")
+    report_parser = commands.add_parser("report", help="print monthly, category and rolling reports")
+    report_parser.add_argument("--range", default="", help="e.g. 2024 or 2023-01..2024-06")
+    report_parser.add_argument("--window", type=int, help="rolling window in months (default 3)")
+    report_parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    serve_parser = commands.add_parser("serve", help="serve ledgers to CLI and GUI clients on this machine")
+    serve_parser.add_argument("--address", help="socket path or host:port to listen on")
+    serve_parser.add_argument("--ledger", dest="ledgers", action="append", default=[], metavar="NAME=PATH",
+                              help="a ledger to serve; repeat for several (default: default=--storage)")
+    return parser.parse_args(argv)
+
+def serve(args):
+    from server import DEFAULT_ADDRESS, run_server
+
+    ledgers = {}
+    for spec in args.ledgers or [f"default={args.storage}"]:
+        name, separator, path = spec.partition("=")
+        if not separator or not name or not path:
+            print(f"Invalid ledger {spec!r}; expected NAME=PATH.")
+            return 1
+        ledgers[name] = path
+    address = args.address or DEFAULT_ADDRESS
+    print(f"Serving {', '.join(sorted(ledgers))} on {address}. Press Ctrl+C to stop.")
+    try:
+        run_server(ledgers, address)
+    except OSError as e:
+        print(f"Could not start the server: {e}")
+        return 1
+    return 0
+
+def run_command(command, args):
+    if command == "cli":
         main_menu()
-    elif choice == "2":
+    elif command == "gui":
         launch_gui()
-    else:
-        print("Invalid choice. Exiting...")
+    elif command == "view":
+        view_transactions()
+    elif command == "summary":
+        display_summary()
+    elif command == "add":
+        return add_from_arguments(args)
+    elif command == "import":
+        read_bulk_transactions_from_file(args.file, args.mode)
+    elif command == "search":
+        return search_transactions(args.text, args.amount, args.date)
+    elif command == "export":
+        export_transactions(args.file)
+        print(f"{len(transactions)} transactions exported to {args.file}.")
+    elif command == "report":
+        try:
+            print_report(run_report(args.range, args.window, args.workers))
+        except ValueError as e:
+            print(f"Invalid report options: {e}")
+            return 1
+    return 0
+
+def main(argv=None):
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+    if args.profile_output:
+        instrumentation.PROFILE_OUTPUT = args.profile_output
+    if args.profile:
+        instrumentation.enable(args.profile)
+    if args.command == "serve":
+        return serve(args)
+    try:
+        if args.server:
+            connect_server(args.server, args.ledger)
+        elif args.storage != STORAGE_PATH or args.shared:
+            use_storage(args.storage, args.shared)
+        load_transactions()
+    except (OSError, ValueError) as e:
+        print(f"Could not open the ledger: {e}")
+        return 1
+
+    command = args.command
+    if command is None:
+        print("\nLaunch Mode:")
+        print("1. CLI Mode (Console)")
+        print("2. GUI Mode (Window)")
+        choice = input("Enter your choice (1 or 2): ")
+        command = {"1": "cli", "2": "gui"}.get(choice)
+        if command is None:
+            print("Invalid choice. Exiting...")
+            return 1
+
+    status = run_command(command, args)
+    try:
+        flush_transactions()
+    except OSError as e:
+        print(f"Could not save changes: {e}")
+        return 1
+    if instrumentation.ENABLED:
+        print(f"Profile written to {instrumentation.dump(extra={'query_cache': storage.queries.stats()})}.")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transaction_store import TransactionStore
+
+CATEGORIES = ["Food", "Rent", "Salary", "Transport", "Utilities", "Entertainment", "Health", "Shopping"]
+
+def generate_rows(count, seed=42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        # Build fresh strings per row, the way json.load hands them back.
+        yield {
+            "amount": round(rng.uniform(1, 5000), 2),
+            "category": "".join(rng.choice(CATEGORIES)),
+            "type": "".join(rng.choice(["Income", "Expense"])),
+            "date": f"{rng.randint(2015, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        }
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return current
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dict_bytes = measure(lambda: list(generate_rows(count)))
+    store_bytes = measure(lambda: TransactionStore(generate_rows(count)))
+
+    print(f"Rows: {count}")
+    print(f"list of dicts:    {dict_bytes / 2**20:8.1f} MiB ({dict_bytes / count:6.1f} B/row)")
+    print(f"TransactionStore: {store_bytes / 2**20:8.1f} MiB ({store_bytes / count:6.1f} B/row)")
+    print(f"Reduction: {dict_bytes / store_bytes:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from generate import generate_rows
+import reporting
+from transaction_store import TransactionStore
+
+def time_report(store, workers, repeat, parallel=True):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        report = reporting.build_report(store, workers=workers, parallel=parallel)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the parallel report engine at several worker counts")
+    parser.add_argument("rows", type=int, nargs="?", default=2_000_000)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="worker counts to try (default: 1, 2, 4, ... up to the core count)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per worker count; the best is kept")
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({1, cores} | {2 ** power for power in range(1, cores.bit_length()) if 2 ** power < cores})
+    store = TransactionStore(generate_rows(args.rows))
+
+    def rounded(report):
+        return [(month, round(income, 2), round(expenses, 2)) for month, income, expenses in report.month_totals()]
+
+    print(f"Rows: {args.rows}, cores: {cores}")
+    if cores == 1:
+        print("Only one core: extra workers share it, so no speedup is possible on this machine.")
+    # Every worker count, 1 included, goes through the pool, so the speedup
+    # column compares like for like; the in-process time is shown alongside.
+    seconds, report = time_report(store, 1, args.repeat, parallel=False)
+    reference = rounded(report)
+    print(f"in-process  {seconds * 1000:10.1f} ms")
+    baseline = None
+    for count in workers:
+        seconds, report = time_report(store, count, args.repeat)
+        if rounded(report) != reference:
+            raise SystemExit(f"{count} workers produced different totals")
+        baseline = baseline or seconds
+        print(f"{count:>3} workers {seconds * 1000:10.1f} ms  speedup {baseline / seconds:5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from generate import generate_rows
+from server import LedgerServer, RemoteStorage
+from storage import open_storage
+
+LEDGERS = ("home", "work")
+
+def client_rows(client, adds):
+    return [{"amount": 1.0, "category": f"Client{client}", "type": "Expense", "date": "2024-01-01"}
+            for _ in range(adds)]
+
+def run_client(connect, client, adds, queries, results):
+    # Alternates adds with summaries and searches; reports the time spent in each.
+    storage = connect()
+    storage.load()
+    add_seconds = query_seconds = 0.0
+    rows = client_rows(client, adds)
+    for position in range(max(adds, queries)):
+        if position < adds:
+            start = time.perf_counter()
+            storage.add(rows[position])
+            add_seconds += time.perf_counter() - start
+        if position < queries:
+            start = time.perf_counter()
+            storage.refresh()
+            if position % 2:
+                storage.transactions.ensure_aggregates().income
+            else:
+                len(storage.transactions.text_search(f"client{client}"))
+            query_seconds += time.perf_counter() - start
+    storage.flush()
+    results.put((add_seconds, query_seconds))
+
+def remote_client(address, ledger, client, adds, queries, results):
+    run_client(lambda: RemoteStorage(address, ledger), client, adds, queries, results)
+
+def shared_client(path, client, adds, queries, results):
+    run_client(lambda: open_storage(path, shared=True), client, adds, queries, results)
+
+def run_clients(targets, args):
+    results = Queue()
+    start = time.perf_counter()
+    processes = [Process(target=target, args=target_args + (client, args.adds, args.queries, results))
+                 for client, (target, target_args) in enumerate(targets)]
+    for process in processes:
+        process.start()
+    timings = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return time.perf_counter() - start, timings
+
+def report(label, elapsed, timings, args):
+    adds = args.adds * len(timings)
+    queries = args.queries * len(timings)
+    print(f"{label}: {len(timings)} clients, {elapsed:.2f} s wall")
+    print(f"  adds:    {adds / elapsed:10.0f}/s overall, {sum(t[0] for t in timings) / adds * 1000:7.3f} ms mean")
+    print(f"  queries: {queries / elapsed:10.0f}/s overall, {sum(t[1] for t in timings) / queries * 1000:7.3f} ms mean")
+
+def check_ledger(storage, expected):
+    counts = {}
+    for row in storage.transactions:
+        counts[row["category"]] = counts.get(row["category"], 0) + 1
+    lost = {category: expected[category] - counts.get(category, 0) for category in expected
+            if counts.get(category, 0) != expected[category]}
+    if lost:
+        raise SystemExit(f"Lost or duplicated writes: {lost}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent adds and queries through the ledger server "
+                                                 "and through file-locked shared ledgers")
+    parser.add_argument("--clients", type=int, default=4, help="client processes per mode")
+    parser.add_argument("--adds", type=int, default=500, help="adds per client")
+    parser.add_argument("--queries", type=int, default=500, help="summaries and searches per client")
+    parser.add_argument("--rows", type=int, default=10_000, help="rows each ledger starts with")
+    parser.add_argument("--suffix", default=".json", help="ledger file type: .json, .snap or .db")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = {}
+        for name in LEDGERS:
+            paths[name] = os.path.join(workdir, name + args.suffix)
+            seed = open_storage(paths[name])
+            seed.load()
+            seed.extend(list(generate_rows(args.rows)))
+            seed.save()
+            seed.close()
+        expected = {name: {"Client" + str(client): args.adds for client in range(args.clients)
+                           if LEDGERS[client % len(LEDGERS)] == name} for name in LEDGERS}
+
+        # Server mode: clients spread over both named ledgers.
+        address = os.path.join(workdir, "server.sock") if hasattr(socket, "AF_UNIX") else "127.0.0.1:8766"
+        server = LedgerServer(paths)
+        server.open()
+        ready = threading.Event()
+        thread = threading.Thread(target=asyncio.run, args=(server.serve(address, ready),))
+        thread.start()
+        ready.wait()
+        try:
+            elapsed, timings = run_clients(
+                [(remote_client, (address, LEDGERS[client % len(LEDGERS)])) for client in range(args.clients)], args)
+            for name in LEDGERS:
+                storage = RemoteStorage(address, name)
+                check_ledger(storage, expected[name])
+                storage.close()
+        finally:
+            server.shutdown()
+            thread.join()
+            server.close()
+        report(f"Server ({', '.join(LEDGERS)})", elapsed, timings, args)
+
+        # Serverless: every client opens the same ledger file with shared=True.
+        path = paths[LEDGERS[0]]
+        before = {}
+        storage = open_storage(path)
+        storage.load()
+        for row in storage.transactions:
+            before[row["category"]] = before.get(row["category"], 0) + 1
+        storage.close()
+        elapsed, timings = run_clients([(shared_client, (path,)) for _ in range(args.clients)], args)
+        storage = open_storage(path)
+        storage.load()
+        check_ledger(storage, {"Client" + str(client): before.get("Client" + str(client), 0) + args.adds
+                               for client in range(args.clients)})
+        storage.close()
+        report(f"Shared file ({LEDGERS[0]}{args.suffix})", elapsed, timings, args)
+    print("No lost writes.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from generate import generate_rows
+from storage import JsonStorage
+
+SCRIPT = os.path.join(ROOT, "Finance_Tracker.py")
+
+def time_command(args, cwd, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as workdir:
+        ledger = JsonStorage(os.path.join(workdir, "transactions.json"))
+        ledger.transactions.extend(generate_rows(count))
+        ledger.save()
+
+        loaded = subprocess.run(
+            [sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import Finance_Tracker; "
+                                   "print(sorted(m for m in ('tkinter', 'sqlite3', 'csv') if m in sys.modules))"],
+            cwd=workdir, check=True, capture_output=True, text=True).stdout.strip()
+
+        interpreter = time_command([sys.executable, "-c", "pass"], workdir, repeats)
+        summary = time_command([sys.executable, SCRIPT, "summary"], workdir, repeats)
+        add = time_command([sys.executable, SCRIPT, "add", "--amount", "1", "--category", "Bench",
+                            "--type", "expense", "--date", "2024-01-01"], workdir, repeats)
+
+    print(f"Rows: {count}, median of {repeats} runs")
+    print(f"Heavy modules imported by Finance_Tracker: {loaded}")
+    print(f"python -c pass: {interpreter * 1000:8.1f} ms")
+    print(f"summary:        {summary * 1000:8.1f} ms")
+    print(f"add:            {add * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
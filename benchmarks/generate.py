@@ -0,0 +1,69 @@
+import csv
+import json
+import random
+import sys
+from datetime import date as Date
+
+# (category, relative frequency, typical amount)
+EXPENSES = [
+    ("Food", 30, 25), ("Transport", 15, 12), ("Shopping", 10, 70), ("Entertainment", 8, 40),
+    ("Utilities", 4, 90), ("Health", 3, 60), ("Education", 2, 150), ("Rent", 2, 1200),
+]
+INCOMES = [("Salary", 3, 3500), ("Freelance", 2, 600), ("Interest", 1, 20)]
+INCOME_SHARE = 0.08
+START = Date(2015, 1, 1).toordinal()
+END = Date(2024, 12, 31).toordinal()
+
+def generate_rows(count, seed=42):
+    # Rows come out in date order, the way a ledger grows, with a
+    # log-normal spread around each category's typical amount.
+    rng = random.Random(seed)
+    expense_names = [name for name, _, _ in EXPENSES]
+    expense_weights = [weight for _, weight, _ in EXPENSES]
+    income_names = [name for name, _, _ in INCOMES]
+    income_weights = [weight for _, weight, _ in INCOMES]
+    typical = {name: amount for name, _, amount in EXPENSES + INCOMES}
+    span = END - START
+
+    for index in range(count):
+        if rng.random() < INCOME_SHARE:
+            type_ = "Income"
+            category = rng.choices(income_names, income_weights)[0]
+        else:
+            type_ = "Expense"
+            category = rng.choices(expense_names, expense_weights)[0]
+        yield {
+            "amount": round(typical[category] * rng.lognormvariate(0, 0.5), 2),
+            "category": category,
+            "type": type_,
+            "date": Date.fromordinal(START + span * index // max(count, 1)).isoformat()
+        }
+
+def write_rows(path, rows):
+    with open(path, "w", newline="") as file:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(file, ["amount", "category", "type", "date"])
+            writer.writeheader()
+            writer.writerows(rows)
+        elif path.endswith((".jsonl", ".ndjson")):
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+        else:
+            file.write('{"transactions": [')
+            for index, row in enumerate(rows):
+                file.write(", " if index else "")
+                file.write(json.dumps(row))
+            file.write("]}")
+
+def main():
+    if len(sys.argv) < 3:
+        print("usage: generate.py COUNT OUTPUT(.json|.jsonl|.csv) [SEED]")
+        return 1
+    count = int(sys.argv[1])
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 42
+    write_rows(sys.argv[2], generate_rows(count, seed))
+    print(f"Wrote {count} transactions to {sys.argv[2]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
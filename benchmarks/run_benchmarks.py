@@ -0,0 +1,227 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import chain
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from generate import generate_rows
+from Finance_Tracker import IMPORT_BATCH_SIZE, iter_csv_columns
+from storage import BinaryStorage, JsonStorage, PartitionedStorage
+from transaction_store import TransactionAggregates
+from validation import validate_columns, validate_rows
+
+DEFAULT_SIZES = [10_000, 100_000]
+RAW_FIELDS = ("amount", "category", "type", "date")
+
+def measure(operation, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        rows = operation()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak, "rows_processed": rows}
+
+def iter_raw_rows(count):
+    # Raw text rows, as a CSV import would see them.
+    for row in generate_rows(count):
+        yield {"amount": f"{row['amount']:.2f}", "category": row["category"],
+               "type": row["type"].lower(), "date": row["date"]}
+
+def raw_columns(count):
+    columns = tuple([] for _ in RAW_FIELDS)
+    for row in iter_raw_rows(count):
+        for column, field in zip(columns, RAW_FIELDS):
+            column.append(row[field])
+    return columns
+
+def import_batches(count):
+    # The batches a CSV import hands to validate_columns, parsed from lines
+    # generated one at a time rather than from a whole CSV text.
+    lines = chain(["amount,category,type,date\n"],
+                  (f"{row['amount']},{row['category']},{row['type']},{row['date']}\n" for row in iter_raw_rows(count)))
+    return list(iter_csv_columns(lines, IMPORT_BATCH_SIZE))
+
+def run_size(count, repeat, workdir):
+    path = os.path.join(workdir, f"transactions-{count}.json")
+    seed = JsonStorage(path)
+    seed.transactions.extend(generate_rows(count))
+    seed.save()
+
+    binary_path = os.path.join(workdir, f"transactions-{count}.snap")
+    binary = BinaryStorage(binary_path, migrate_from=path)
+    binary.load()
+
+    partitioned = PartitionedStorage(os.path.join(workdir, f"partitions-{count}"), migrate_from=path)
+    partitioned.load()
+
+    ledger = JsonStorage(path)
+    store = ledger.transactions
+
+    def load():
+        ledger.load()
+        return len(store)
+
+    def save():
+        ledger.save()
+        return len(store)
+
+    def load_binary():
+        binary.load()
+        return len(binary.transactions)
+
+    def save_binary():
+        binary.save()
+        return len(binary.transactions)
+
+    def load_partitioned():
+        partitioned.load()
+        return len(partitioned.transactions)
+
+    def summary_partitioned():
+        # Freshly loaded, so this is answered from the manifest alone.
+        partitioned.transactions.ensure_aggregates()
+        return len(partitioned.transactions)
+
+    def search_partitioned_recent():
+        return len(partitioned.transactions.search("date", "2024-01..2024-03"))
+
+    def summary_cold():
+        store.aggregates = None
+        summary = store.ensure_aggregates()
+        return len(store) if summary is not None else 0
+
+    def summary_warm():
+        store.ensure_aggregates()
+        return 1
+
+    def search(field, value):
+        return lambda: len(store.search(field, value))
+
+    def sort_cold():
+        store.sort_orders.clear()
+        return len(store.sort_order("amount"))
+
+    def sort_desc_page():
+        return len(store.sorted_view("amount", reverse=True)[:500])
+
+    def validate_import_batches(batches):
+        return sum(len(validate_columns(*batch)[0]["amount"]) for batch in batches)
+
+    def validate(rows):
+        transactions, errors = validate_rows(rows)
+        return len(transactions) + len(errors)
+
+    def validate_raw_columns(raw):
+        columns, errors = validate_columns(*raw)
+        return len(columns["amount"]) + len(errors)
+
+    operations = [
+        ("load_transactions", load),
+        ("save_transactions", save),
+        ("load_binary_snapshot", load_binary),
+        ("save_binary_snapshot", save_binary),
+        ("load_partitioned", load_partitioned),
+        ("summary_partitioned", summary_partitioned),
+        ("search_partitioned_range", search_partitioned_recent),
+        ("display_summary_cold", summary_cold),
+        ("display_summary_warm", summary_warm),
+        ("search_category", search("category", "food")),
+        ("search_type", search("type", "income")),
+        ("search_date_range", search("date", "2020-01..2020-03")),
+        ("search_text_prefix", lambda: len(store.text_search("trans"))),
+        ("search_text_filtered", lambda: len(store.text_search("foood", "10..50", "2020"))),
+        ("sort_amount_cold", sort_cold),
+        ("sort_amount_desc_page", sort_desc_page),
+        # (name, operation, fixture): the fixture's input is built only for
+        # its own benchmark and released before the next one.
+        ("validate_import_batches", validate_import_batches, lambda: import_batches(count)),
+        ("validate_columns", validate_raw_columns, lambda: raw_columns(count)),
+        ("validate_rows", validate, lambda: list(iter_raw_rows(count))),
+    ]
+    results = []
+    for name, operation, *fixture in operations:
+        if fixture:
+            data = fixture[0]()
+            result = measure(lambda: operation(data), repeat)
+            del data
+        else:
+            result = measure(operation, repeat)
+        result.update(name=name, rows=count)
+        results.append(result)
+        print(f"{count:>10} {name:<24} {result['seconds'] * 1000:10.2f} ms {result['peak_bytes'] / 2**20:10.1f} MiB")
+
+    if not store.ensure_aggregates().matches(TransactionAggregates(store)):
+        raise SystemExit("running aggregates disagree with a full recompute")
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as file:
+        baseline = {(r["name"], r["rows"]): r for r in json.load(file)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get((result["name"], result["rows"]))
+        if before and before["seconds"] > 0 and result["seconds"] / before["seconds"] > threshold:
+            regressions.append((result, before))
+    for result, before in regressions:
+        print(f"REGRESSION {result['name']} @ {result['rows']} rows: "
+              f"{before['seconds'] * 1000:.2f} ms -> {result['seconds'] * 1000:.2f} ms")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the tracker's hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="ledger sizes to test, e.g. 10000 100000 1000000 10000000")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per operation; the best is kept")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in args.sizes:
+            results.extend(run_size(count, args.repeat, workdir))
+
+    assert "tkinter" not in sys.modules
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Off unless FINANCE_TRACKER_PROFILE is set or --profile is given. Wrapped
+# functions test ENABLED once per call and do nothing else while it is off.
+# Modes: "timing" (timers and counters), "cprofile" (timing plus a cProfile
+# capture of the main thread) and "tracemalloc" (timing plus allocation sites).
+MODES = ("timing", "cprofile", "tracemalloc")
+ENABLED = False
+MODE = None
+PROFILE_OUTPUT = "profile_stats.json"
+SAMPLE_LIMIT = 10_000
+TOP_ENTRIES = 20
+
+metrics = {}
+metrics_lock = threading.Lock()
+profiler = None
+started = None
+
+
+class Metric:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.written = 0
+        # Percentiles are taken over the most recent SAMPLE_LIMIT calls.
+        self.samples = deque(maxlen=SAMPLE_LIMIT)
+
+    def summary(self):
+        samples = sorted(self.samples)
+
+        def percentile(fraction):
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000 if samples else 0.0
+
+        return {
+            "calls": self.calls,
+            "total_ms": self.seconds * 1000,
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "max_ms": samples[-1] * 1000 if samples else 0.0,
+            "rows": self.rows,
+            "bytes_written": self.written,
+        }
+
+
+def enable(mode="timing"):
+    global ENABLED, MODE, profiler, started
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}; expected one of {', '.join(MODES)}")
+    if ENABLED:
+        return
+    MODE = mode
+    started = time.time()
+    if mode == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == "tracemalloc":
+        import tracemalloc
+
+        tracemalloc.start()
+    ENABLED = True
+
+
+def _metric(name):
+    metric = metrics.get(name)
+    if metric is None:
+        metric = metrics[name] = Metric()
+    return metric
+
+
+def record(name, seconds, rows=0):
+    with metrics_lock:
+        metric = _metric(name)
+        metric.calls += 1
+        metric.seconds += seconds
+        metric.rows += rows
+        metric.samples.append(seconds)
+
+
+def count(name, rows=0, written=0):
+    # Adds rows or bytes to a metric without a timing sample.
+    if not ENABLED:
+        return
+    with metrics_lock:
+        metric = _metric(name)
+        metric.rows += rows
+        metric.written += written
+
+
+def timed(name, rows=None):
+    # rows, if given, maps the wrapped function's result to a row count.
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            record(name, time.perf_counter() - start, rows(result) if rows is not None else 0)
+            return result
+        return wrapper
+    return decorate
+
+
+def stats():
+    with metrics_lock:
+        return {name: metrics[name].summary() for name in sorted(metrics)}
+
+
+def profile_entries():
+    import pstats
+
+    profile = pstats.Stats(profiler)
+    entries = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in profile.stats.items():
+        entries.append({"function": f"{os.path.basename(filename)}:{line}({function})", "calls": calls,
+                        "own_ms": own * 1000, "cumulative_ms": cumulative * 1000})
+    entries.sort(key=lambda entry: entry["cumulative_ms"], reverse=True)
+    return entries[:TOP_ENTRIES]
+
+
+def memory_entries():
+    import tracemalloc
+
+    current, peak = tracemalloc.get_traced_memory()
+    top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ENTRIES]
+    return {
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "top": [{"location": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count} for stat in top],
+    }
+
+
+def report():
+    data = {"mode": MODE, "enabled": ENABLED, "started": started, "metrics": stats()}
+    if MODE == "cprofile":
+        profiler.disable()
+        try:
+            data["profile"] = profile_entries()
+        finally:
+            profiler.enable()
+    elif MODE == "tracemalloc":
+        data["memory"] = memory_entries()
+    return data
+
+
+def dump(path=None, extra=None):
+    # Writes report(), plus any extra sections, as JSON; cprofile mode also
+    # leaves the raw profile in <path>.prof for pstats or snakeviz.
+    path = path or PROFILE_OUTPUT
+    data = report()
+    data.update(extra or {})
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2)
+    if MODE == "cprofile":
+        profiler.dump_stats(path + ".prof")
+    return path
+
+
+if os.environ.get("FINANCE_TRACKER_PROFILE"):
+    _mode = os.environ["FINANCE_TRACKER_PROFILE"].strip().lower()
+    enable(_mode if _mode in MODES else "timing")
@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+
+QUERY_CACHE_SIZE = 128
+
+
+class QueryCache:
+    # Results of read-only queries keyed on (query, parameters) and tagged
+    # with the ledger version they were computed at. Every change to the
+    # ledger bumps the version, so an entry from an older version is never
+    # returned: it is dropped when it is next looked up, or earlier by LRU
+    # eviction once more than maxsize entries are held.
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key, version, compute):
+        # version must be read before compute runs, so a result is never
+        # tagged with a version newer than the data it was computed from.
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] == version:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return entry[1]
+                self.stale += 1
+                del self.entries[key]
+            self.misses += 1
+
+        result = compute()
+        with self.lock:
+            self.entries[key] = (version, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,202 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from transaction_store import TransactionStore, month_of, parse_date_query
+
+# Below this many rows starting worker processes costs more than it saves.
+PARALLEL_THRESHOLD = 250_000
+PARTITIONS_PER_WORKER = 2
+ROLLING_WINDOW = 3
+
+
+def aggregate_partition(amounts, dates, codes, incomes, category_count, first=None, last=None):
+    # Sums amounts per (day, category, type). Keys pack the three into one int
+    # so the hot loop does a single dict update per row; the partial result is
+    # only as large as the number of distinct days times categories.
+    sums = defaultdict(float)
+    counts = defaultdict(int)
+    stride = category_count * 2
+    if first is None:
+        for amount, ordinal, code, income in zip(amounts, dates, codes, incomes):
+            key = ordinal * stride + code * 2 + income
+            sums[key] += amount
+            counts[key] += 1
+    else:
+        for amount, ordinal, code, income in zip(amounts, dates, codes, incomes):
+            if first <= ordinal <= last:
+                key = ordinal * stride + code * 2 + income
+                sums[key] += amount
+                counts[key] += 1
+    return {key: (total, counts[key]) for key, total in sums.items()}
+
+
+def _shared_views(buffer, count):
+    # Column layout inside the shared block: amounts, dates, category codes,
+    # then one income byte per row.
+    return (
+        buffer[:8 * count].cast("d"),
+        buffer[8 * count:12 * count].cast("i"),
+        buffer[12 * count:16 * count].cast("I"),
+        buffer[16 * count:17 * count],
+    )
+
+
+def _aggregate_shared(name, count, start, stop, category_count, first, last):
+    from multiprocessing import shared_memory
+
+    block = shared_memory.SharedMemory(name=name)
+    views = _shared_views(block.buf, count)
+    slices = [view[start:stop] for view in views]
+    try:
+        return aggregate_partition(*slices, category_count, first, last)
+    finally:
+        for view in slices + list(views):
+            view.release()
+        block.close()
+
+
+def share_columns(store):
+    # Copies the store's columns into one shared memory block so that worker
+    # processes can read them directly instead of receiving pickled rows.
+    from multiprocessing import shared_memory
+
+    count = len(store)
+    block = shared_memory.SharedMemory(create=True, size=max(17 * count, 1))
+    views = _shared_views(block.buf, count)
+    try:
+        for view, column in zip(views, (store.amounts, store.dates, store.categories, store.income_mask())):
+            view[:] = memoryview(column)
+    except BaseException:
+        block.unlink()
+        raise
+    finally:
+        for view in views:
+            view.release()
+    return block
+
+
+def partition_bounds(count, partitions):
+    size = -(-count // partitions) if count else 0
+    return [(start, min(start + size, count)) for start in range(0, count, size)] if size else []
+
+
+def merge_partials(partials):
+    merged = {}
+    for partial in partials:
+        for key, (total, count) in partial.items():
+            previous = merged.get(key)
+            merged[key] = (total + previous[0], count + previous[1]) if previous else (total, count)
+    return merged
+
+
+class Report:
+    # Totals are indexed by the type bit like TransactionAggregates:
+    # [expense, income, row count].
+    def __init__(self, merged, category_names, window=ROLLING_WINDOW):
+        self.window = window
+        self.totals = [0.0, 0.0, 0]
+        self.by_category = {}
+        self.by_month = {}
+        stride = len(category_names) * 2
+        for key, (total, count) in merged.items():
+            ordinal, rest = divmod(key, stride)
+            code, income = divmod(rest, 2)
+            for table, group in ((self.by_category, category_names[code]), (self.by_month, month_of(ordinal))):
+                totals = table.get(group)
+                if totals is None:
+                    totals = table[group] = [0.0, 0.0, 0]
+                totals[income] += total
+                totals[2] += count
+            self.totals[income] += total
+            self.totals[2] += count
+
+    @property
+    def income(self):
+        return self.totals[1]
+
+    @property
+    def expenses(self):
+        return self.totals[0]
+
+    @property
+    def net(self):
+        return self.totals[1] - self.totals[0]
+
+    def category_totals(self):
+        return sorted((name, income, expenses) for name, (expenses, income, _) in self.by_category.items())
+
+    def month_totals(self):
+        return sorted((month, income, expenses) for month, (expenses, income, _) in self.by_month.items())
+
+    def rolling_totals(self):
+        # Trailing totals over the last `window` calendar months, including
+        # months without any transactions.
+        if not self.by_month:
+            return []
+        first, last = min(self.by_month), max(self.by_month)
+        year, month = int(first[:4]), int(first[5:])
+        series = []
+        while True:
+            label = f"{year:04d}-{month:02d}"
+            expenses, income, _ = self.by_month.get(label, (0.0, 0.0, 0))
+            series.append((label, income, expenses))
+            if label == last:
+                break
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        rolling = []
+        income_sum = expense_sum = 0.0
+        for position, (label, income, expenses) in enumerate(series):
+            income_sum += income
+            expense_sum += expenses
+            if position >= self.window:
+                income_sum -= series[position - self.window][1]
+                expense_sum -= series[position - self.window][2]
+            rolling.append((label, income_sum, expense_sum))
+        return rolling
+
+
+def build_report(store, date_range="", window=ROLLING_WINDOW, workers=None, lock=None, parallel=None):
+    first = last = None
+    if date_range.strip():
+        bounds = parse_date_query(date_range)
+        if bounds is None:
+            raise ValueError(f"Invalid date range {date_range!r}")
+        first, last = bounds
+    if window < 1:
+        raise ValueError("Rolling window must be at least one month")
+
+    workers = workers or os.cpu_count() or 1
+    # parallel=True uses the worker pool even for one worker or a small
+    # ledger, so benchmarks compare like for like; None decides by size.
+    if parallel is None:
+        parallel = workers > 1 and len(store) >= PARALLEL_THRESHOLD
+    # Only the copy out of the store happens under the lock; the aggregation
+    # itself runs on the private copy.
+    with lock if lock is not None else nullcontext():
+        if not isinstance(store, TransactionStore):
+            store = TransactionStore(store.rows())
+        elif not parallel:
+            store = store.copy()
+        category_names = list(store.category_names)
+        if parallel:
+            count = len(store)
+            block = share_columns(store)
+
+    if not parallel:
+        partial = aggregate_partition(store.amounts, store.dates, store.categories, store.income_mask(),
+                                      len(category_names), first, last)
+        return Report(partial, category_names, window)
+
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_aggregate_shared, block.name, count, start, stop,
+                                       len(category_names), first, last)
+                       for start, stop in partition_bounds(count, workers * PARTITIONS_PER_WORKER)]
+            partials = [future.result() for future in futures]
+    finally:
+        block.close()
+        block.unlink()
+    return Report(merge_partials(partials), category_names, window)
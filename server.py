@@ -0,0 +1,425 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+
+from query_cache import QueryCache
+from storage import Batch, open_storage
+from transaction_store import FIELDS
+
+# A Unix socket where the platform has them, otherwise a localhost TCP port.
+# Either way only processes on this machine can connect.
+DEFAULT_ADDRESS = (os.path.join(tempfile.gettempdir(), "finance_tracker.sock") if hasattr(socket, "AF_UNIX")
+                   else "127.0.0.1:8765")
+DEFAULT_LEDGER = "default"
+PAGE_SIZE = 500
+# Longest request or response line; an import batch is sent as one request.
+MESSAGE_LIMIT = 64 * 1024 * 1024
+ERRORS = {error.__name__: error for error in (ValueError, IndexError, KeyError, TypeError, TimeoutError)}
+
+
+def parse_address(address):
+    # "host:port" or ":port" is TCP; anything else is a Unix socket path.
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def remove_stale_socket(path):
+    # A socket file left by a server that exited without cleaning up.
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise OSError(f"Another server is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def encode(message):
+    return (json.dumps(message) + "\n").encode()
+
+
+def plain_rows(rows):
+    return [dict(row) for row in rows]
+
+
+class LedgerServer:
+    # Owns one storage per named ledger and answers newline-delimited JSON
+    # requests from any number of clients. Requests are handled one at a time
+    # on the event loop's thread, so clients never see a half-applied batch
+    # and the stores need no locking beyond what they already do. File
+    # ledgers are opened with shared=False, so the server holds their locks
+    # while it runs and processes opening the same file directly are turned
+    # away instead of writing behind its back.
+    def __init__(self, ledgers):
+        self.paths = dict(ledgers)
+        self.storages = {}
+        self.connections = set()
+        self.loop = None
+        self.stopping = None
+
+    def open(self):
+        for name, path in self.paths.items():
+            storage = open_storage(path, shared=False)
+            self.storages[name] = storage
+            storage.load()
+            if storage.rejected:
+                print(f"{name}: {len(storage.rejected)} stored transaction(s) could not be read and were left out; "
+                      f"they were copied to {storage.rejected_path}.")
+
+    def close(self):
+        for storage in self.storages.values():
+            storage.flush()
+            storage.close()
+        self.storages.clear()
+
+    def dispatch(self, request):
+        try:
+            method = request["method"]
+            if method == "ledgers":
+                return {"id": request.get("id"), "result": sorted(self.storages)}
+            name = request.get("ledger", DEFAULT_LEDGER)
+            storage = self.storages.get(name)
+            if storage is None:
+                raise ValueError(f"Unknown ledger {name!r}")
+            handler = getattr(self, "do_" + method, None)
+            if handler is None:
+                raise ValueError(f"Unknown method {method!r}")
+            # Picks up commits other SQLite connections made to the same database.
+            storage.refresh()
+            result = handler(storage, **request.get("params", {}))
+        except Exception as e:
+            return {"id": request.get("id"), "error": str(e), "type": type(e).__name__}
+        return {"id": request.get("id"), "result": result}
+
+    def do_version(self, storage):
+        return storage.version
+
+    def do_len(self, storage):
+        return len(storage.transactions)
+
+    def do_rows(self, storage, start, stop):
+        return plain_rows(storage.transactions[start:stop])
+
+    def do_batch(self, storage, operations):
+        storage.apply_batch(operations)
+        return storage.version
+
+    def do_replace(self, storage, columns):
+        storage.replace_columns([columns])
+        return storage.version
+
+    def do_summary(self, storage):
+        def compute():
+            summary = storage.transactions.ensure_aggregates()
+            return {"income": summary.income, "expenses": summary.expenses, "net": summary.net,
+                    "categories": summary.category_totals(), "months": summary.month_totals()}
+
+        return storage.cached(("summary",), compute)
+
+    def do_query(self, storage, query, start=0, stop=PAGE_SIZE):
+        # query is ["search", field, value], ["text_search", text, amount, date]
+        # or ["sorted", field, reverse]; the full result stays cached here and
+        # clients fetch it a page at a time.
+        kind, *args = query
+        store = storage.transactions
+        if kind == "search":
+            compute = lambda: store.search(*args)
+        elif kind == "text_search":
+            compute = lambda: store.text_search(*args)
+        elif kind == "sorted":
+            compute = lambda: store.sorted_view(*args)
+        else:
+            raise ValueError(f"Unknown query {kind!r}")
+        rows = storage.cached(tuple(query), compute)
+        return {"count": len(rows), "rows": plain_rows(rows[start:stop]), "version": storage.version}
+
+    def do_flush(self, storage):
+        storage.flush()
+
+    def do_save(self, storage):
+        storage.save()
+
+    async def handle(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {"id": None, "error": "Malformed request", "type": "ValueError"}
+                else:
+                    response = self.dispatch(request)
+                writer.write(encode(response))
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # Client went away, or sent a line longer than MESSAGE_LIMIT.
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def serve(self, address=DEFAULT_ADDRESS, ready=None):
+        import asyncio
+        import signal
+
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, "SIGTERM"):
+            try:
+                self.loop.add_signal_handler(signal.SIGTERM, self.stopping.set)
+            except NotImplementedError:
+                pass
+        target = parse_address(address)
+        unix_path = None
+        try:
+            if isinstance(target, tuple):
+                server = await asyncio.start_server(self.handle, *target, limit=MESSAGE_LIMIT)
+            else:
+                remove_stale_socket(target)
+                server = await asyncio.start_unix_server(self.handle, target, limit=MESSAGE_LIMIT)
+                unix_path = target
+            async with server:
+                if ready is not None:
+                    ready.set()
+                await self.stopping.wait()
+                # Closing a connection ends its handler at the next read.
+                for writer in list(self.connections):
+                    writer.close()
+                while self.connections:
+                    await asyncio.sleep(0.01)
+        finally:
+            if unix_path is not None and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+    def shutdown(self):
+        # Safe to call from any thread.
+        self.loop.call_soon_threadsafe(self.stopping.set)
+
+
+def run_server(ledgers, address=DEFAULT_ADDRESS, ready=None):
+    # Serves until interrupted or sent SIGTERM, then writes out every ledger.
+    import asyncio
+
+    server = LedgerServer(ledgers)
+    try:
+        server.open()
+        asyncio.run(server.serve(address, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+class LedgerClient:
+    # One connection, shared by the threads of a client process.
+    def __init__(self, address=DEFAULT_ADDRESS, ledger=DEFAULT_LEDGER):
+        self.ledger = ledger
+        target = parse_address(address)
+        if isinstance(target, tuple):
+            self.socket = socket.create_connection(target)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(target)
+        self.file = self.socket.makefile("rb")
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+    def call(self, method, **params):
+        with self.lock:
+            self.next_id += 1
+            request = {"id": self.next_id, "ledger": self.ledger, "method": method, "params": params}
+            self.socket.sendall(encode(request))
+            line = self.file.readline()
+        if not line:
+            raise ConnectionError("Ledger server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise ERRORS.get(response["type"], RuntimeError)(response["error"])
+        return response["result"]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+class RemoteSummary:
+    def __init__(self, data):
+        self.income = data["income"]
+        self.expenses = data["expenses"]
+        self.net = data["net"]
+        self.categories = [tuple(row) for row in data["categories"]]
+        self.months = [tuple(row) for row in data["months"]]
+
+    def category_totals(self):
+        return self.categories
+
+    def month_totals(self):
+        return self.months
+
+
+class RemoteRows:
+    # A query result held by the server, fetched a page at a time.
+    def __init__(self, client, query):
+        self.client = client
+        self.query = query
+        self.page_start = 0
+        self.page = []
+        self.count = self._fetch(0)
+
+    def _fetch(self, start):
+        result = self.client.call("query", query=self.query, start=start, stop=start + PAGE_SIZE)
+        self.page_start, self.page = start, result["rows"]
+        return result["count"]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.count)
+            if step != 1:
+                return [self[index] for index in range(start, stop, step)]
+            if start >= stop:
+                return []
+            return self.client.call("query", query=self.query, start=start, stop=stop)["rows"]
+        if item < 0:
+            item += self.count
+        if not 0 <= item < self.count:
+            raise IndexError("transaction index out of range")
+        if not self.page_start <= item < self.page_start + len(self.page):
+            self._fetch(item - item % PAGE_SIZE)
+        return self.page[item - self.page_start]
+
+    def __iter__(self):
+        for start in range(0, self.count, PAGE_SIZE):
+            yield from self[start:start + PAGE_SIZE]
+
+
+class RemoteStore:
+    # The slice of the TransactionStore interface the CLI and GUI use.
+    def __init__(self, client):
+        self.client = client
+
+    def __len__(self):
+        return self.client.call("len")
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return self.client.call("rows", start=start, stop=stop)[::step]
+            return self.client.call("rows", start=start, stop=stop) if start < stop else []
+        if item < 0:
+            item += len(self)
+        rows = self.client.call("rows", start=item, stop=item + 1) if item >= 0 else []
+        if not rows:
+            raise IndexError("transaction index out of range")
+        return rows[0]
+
+    def __iter__(self):
+        start = 0
+        while True:
+            rows = self.client.call("rows", start=start, stop=start + PAGE_SIZE)
+            yield from rows
+            if len(rows) < PAGE_SIZE:
+                return
+            start += PAGE_SIZE
+
+    def rows(self):
+        return iter(self)
+
+    def search(self, field, value):
+        return RemoteRows(self.client, ["search", field, value])
+
+    def text_search(self, text, amount_range="", date_range=""):
+        return RemoteRows(self.client, ["text_search", text, amount_range, date_range])
+
+    def sorted_view(self, field="amount", reverse=False):
+        return RemoteRows(self.client, ["sorted", field, reverse])
+
+    def ensure_aggregates(self):
+        return RemoteSummary(self.client.call("summary"))
+
+
+class RemoteStorage:
+    # Storage interface over a LedgerClient, so the CLI and GUI can use a
+    # ledger owned by a running server exactly as they use a local one.
+    def __init__(self, address=DEFAULT_ADDRESS, ledger=DEFAULT_LEDGER):
+        self.address = address
+        self.ledger = ledger
+        self.client = LedgerClient(address, ledger)
+        self.transactions = RemoteStore(self.client)
+        self.lock = threading.Lock()
+        self.queries = QueryCache()
+        # Rows the server left out when loading are reported in its own output.
+        self.rejected = []
+
+    @property
+    def version(self):
+        return self.client.call("version")
+
+    def load(self):
+        # Fails early with ValueError if the server has no such ledger.
+        self.client.call("version")
+
+    def refresh(self, timeout=None):
+        pass
+
+    def save(self):
+        self.client.call("save")
+
+    def flush(self):
+        self.client.call("flush")
+
+    def save_state(self):
+        return "saved"
+
+    def apply_batch(self, operations):
+        self.client.call("batch", operations=operations)
+
+    def batch(self):
+        return Batch(self)
+
+    def cached(self, key, compute):
+        return self.queries.get(key, self.version, compute)
+
+    def add(self, transaction):
+        self.apply_batch([{"op": "add", "transaction": dict(transaction)}])
+
+    def update(self, index, transaction):
+        self.apply_batch([{"op": "update", "index": index, "transaction": dict(transaction)}])
+
+    def delete(self, index):
+        self.apply_batch([{"op": "delete", "index": index}])
+
+    def extend(self, batch):
+        self.apply_batch([{"op": "extend", "transactions": [dict(row) for row in batch]}])
+
+    def extend_columns(self, columns):
+        self.apply_batch([{"op": "extend_columns", "columns": {field: list(columns[field]) for field in FIELDS}}])
+
+    def clear(self):
+        self.apply_batch([{"op": "clear"}])
+
+    def replace_columns(self, batches):
+        # Sent as one request so the server swaps the rows in at once.
+        columns = {field: [] for field in FIELDS}
+        for batch in batches:
+            for field in FIELDS:
+                columns[field].extend(batch[field])
+        self.client.call("replace", columns=columns)
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,1584 @@
+import heapq
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from contextlib import nullcontext
+from itertools import chain, islice, repeat
+from operator import itemgetter
+
+from text_search import TrigramIndex, score_text
+from transaction_store import FIELDS, TransactionStore, copy_column, ordinal_to_date, parse_date_query, parse_text_filters
+from instrumentation import count, timed
+from query_cache import QueryCache
+from validation import check_columns, validate_rows, validate_transaction
+
+TRANSACTIONS_FILE = "transactions.json"
+COMPACT_THRESHOLD = 1000
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+BINARY_SUFFIXES = (".snap",)
+
+# Date-partitioned ledgers: one binary snapshot per period plus a manifest
+# holding each partition's file, row count and totals.
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+PERIOD_LENGTHS = {"month": 7, "year": 4}
+PARTITION_CACHE_BYTES = 64 * 2**20
+# Amount, date ordinal and category code columns plus the type bit.
+PARTITION_ROW_BYTES = 17
+
+# Binary snapshot header: magic, format version, reserved flags, row count,
+# journal seq and the size of the category table, padded to 64 bytes so every
+# column starts 8-byte aligned. Columns are always little-endian.
+SNAPSHOT_MAGIC = b"FTSNAP\0\0"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIIQQQ")
+SNAPSHOT_HEADER_SIZE = 64
+
+# How long a shared ledger waits for another process to release its lock.
+LOCK_TIMEOUT = 10.0
+LOCK_POLL_SECONDS = 0.01
+
+def sync_directory(path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _try_lock(file):
+    if os.name == "nt":
+        import msvcrt
+
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    import fcntl
+
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+def _unlock(file):
+    if os.name == "nt":
+        import msvcrt
+
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class FileLock:
+    # Advisory lock on a side file, held by at most one process at a time.
+    # Re-entrant within a process, so a batch can hold it across catching
+    # up, applying and writing while other threads wait their turn.
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.depth = 0
+        self.mutex = threading.RLock()
+
+    def acquire(self, timeout=LOCK_TIMEOUT):
+        if not self.mutex.acquire(timeout=timeout):
+            raise TimeoutError(f"{self.path} is held by another thread")
+        if self.depth == 0:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                file = open(self.path, "a+")
+                deadline = time.monotonic() + timeout
+                while not _try_lock(file):
+                    if time.monotonic() >= deadline:
+                        file.close()
+                        raise TimeoutError(f"{self.path} is held by another process")
+                    time.sleep(LOCK_POLL_SECONDS)
+            except BaseException:
+                self.mutex.release()
+                raise
+            self.file = file
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            _unlock(self.file)
+            self.file.close()
+            self.file = None
+        self.mutex.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.release()
+        return False
+
+
+def apply_operation(store, operation):
+    op = operation["op"]
+    if op == "add":
+        store.append(operation["transaction"])
+    elif op == "update":
+        store[operation["index"]] = operation["transaction"]
+    elif op == "delete":
+        del store[operation["index"]]
+    elif op == "extend":
+        store.extend(operation["transactions"])
+    elif op == "extend_columns":
+        store.extend_columns(operation["columns"])
+    elif op == "recategorize":
+        for index in operation["indices"]:
+            row = dict(store[index])
+            row["category"] = operation["category"]
+            store[index] = row
+    elif op == "clear":
+        store.clear()
+    elif op == "batch":
+        for nested in operation["ops"]:
+            apply_operation(store, nested)
+
+def check_operations(operations, length):
+    # Validates a whole batch against the ledger length it will see, so that
+    # applying it afterwards cannot fail half-way through.
+    def check_index(index):
+        if not isinstance(index, int) or not 0 <= index < length:
+            raise IndexError(f"transaction index {index!r} out of range")
+
+    for operation in operations:
+        op = operation["op"]
+        if op == "add":
+            validate_transaction(operation["transaction"])
+            length += 1
+        elif op == "update":
+            check_index(operation["index"])
+            validate_transaction(operation["transaction"])
+        elif op == "delete":
+            check_index(operation["index"])
+            length -= 1
+        elif op == "extend":
+            for transaction in operation["transactions"]:
+                validate_transaction(transaction)
+            length += len(operation["transactions"])
+        elif op == "extend_columns":
+            length += check_columns(operation["columns"])
+        elif op == "recategorize":
+            for index in operation["indices"]:
+                check_index(index)
+        elif op == "clear":
+            length = 0
+        else:
+            raise ValueError(f"Unknown operation {op!r}")
+
+
+class Batch:
+    # Collects changes and applies them together when the with-block exits
+    # cleanly; an exception inside the block discards them all.
+    def __init__(self, storage):
+        self.storage = storage
+        self.operations = []
+
+    def add(self, transaction):
+        self.operations.append({"op": "add", "transaction": dict(transaction)})
+
+    def update(self, index, transaction):
+        self.operations.append({"op": "update", "index": index, "transaction": dict(transaction)})
+
+    def delete(self, index):
+        self.operations.append({"op": "delete", "index": index})
+
+    def delete_many(self, indices):
+        # Highest first, so earlier deletes do not shift the later ones.
+        for index in sorted(set(indices), reverse=True):
+            self.delete(index)
+
+    def recategorize(self, indices, category):
+        self.operations.append({"op": "recategorize", "indices": sorted(set(indices)), "category": category})
+
+    def commit(self):
+        operations, self.operations = self.operations, []
+        if operations:
+            self.storage.apply_batch(operations)
+
+    def rollback(self):
+        self.operations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+@timed("storage.write_json")
+def write_json_rows(path, rows, seq=None):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        # Rows are written one at a time so a large store is never expanded
+        # into a full list of dicts.
+        file.write("{" if seq is None else f'{{"seq": {seq}, ')
+        file.write('"transactions": [')
+        for index, row in enumerate(rows.rows()):
+            file.write(", " if index else "")
+            file.write(json.dumps(row))
+        file.write("]}")
+        file.flush()
+        os.fsync(file.fileno())
+        count("storage.write_json", len(rows), file.tell())
+    os.replace(tmp_path, path)
+    sync_directory(path)
+
+def open_storage(path=TRANSACTIONS_FILE, shared=False):
+    lower_path = path.lower()
+    if path.endswith(("/", os.sep)) or os.path.isdir(path):
+        return PartitionedStorage(path, shared=shared)
+    if lower_path.endswith(SQLITE_SUFFIXES):
+        return SqliteStorage(path)
+    if lower_path.endswith(BINARY_SUFFIXES):
+        return BinaryStorage(path, shared=shared)
+    return JsonStorage(path, shared=shared)
+
+
+class JournalWriter:
+    # Appends journal records on a background thread so an edit returns as
+    # soon as it is applied in memory. Records queued while a write is running
+    # go out together in the next one, with a single fsync. The thread exits
+    # once the queue is empty; it is not a daemon, so queued records are
+    # written before the interpreter exits.
+    def __init__(self, write):
+        self.write = write
+        self.pending = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.writing = False
+        self.error = None
+        self.writes = 0
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="journal-writer")
+            self.thread.start()
+
+    def submit(self, record):
+        with self.condition:
+            self.pending.append(record)
+            self._start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                records, self.pending = self.pending, []
+                if not records:
+                    self.thread = None
+                    self.condition.notify_all()
+                    return
+                self.writing = True
+            try:
+                self.write(records)
+            except Exception as e:
+                # Keep the records queued; the next submit or flush retries them.
+                with self.condition:
+                    self.pending[:0] = records
+                    self.error = e
+                    self.writing = False
+                    self.thread = None
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                self.error = None
+                self.writing = False
+                self.writes += 1
+
+    def flush(self):
+        with self.condition:
+            if self.pending:
+                self._start()
+            while self.thread is not None:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+
+    def state(self):
+        with self.condition:
+            if self.error is not None:
+                return "error"
+            return "saving" if self.pending or self.writing else "saved"
+
+
+class JsonStorage:
+    # transactions.json holds a snapshot and transactions.journal the edits
+    # made since; every change is queued for the journal writer and a
+    # background thread folds the journal into a new snapshot once it grows
+    # past COMPACT_THRESHOLD.
+    #
+    # By default the ledger's lock file is held from load() to close(), so a
+    # second process opening the same ledger is refused. With shared=True
+    # several processes can use it instead: each change takes the lock, first
+    # replays whatever the other processes appended to the journal, and is on
+    # disk before the lock is released.
+    def __init__(self, path=TRANSACTIONS_FILE, shared=False):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".journal"
+        self.transactions = TransactionStore()
+        self.lock = threading.Lock()
+        # Held while the journal file is appended to or replaced. The writer
+        # thread takes only this lock, never self.lock.
+        self.journal_lock = threading.Lock()
+        self.writer = JournalWriter(self.write_journal)
+        # Serializes snapshot writers, so a compaction that copied an older
+        # state cannot finish after a save and replace its newer snapshot.
+        # Taken before self.lock whenever both are held.
+        self.write_lock = threading.Lock()
+        self.snapshot_file_lock = None
+        self.written_seq = 0
+        # (row number, reason) for snapshot rows the last load had to leave out.
+        self.rejected = []
+        self.rejected_path = os.path.splitext(path)[0] + ".rejected.json"
+        self.seq = 0
+        self.journal_count = 0
+        self.compacting = False
+        # Bumped by every load and every applied batch; tags cached query results.
+        self.version = 0
+        self.queries = QueryCache()
+        self.shared = shared
+        self.file_lock = None
+        # (device, inode, size) of the journal as far as it has been applied.
+        self.journal_mark = None
+
+    def lock_path(self):
+        return self.journal_path + ".lock"
+
+    def ledger_lock(self):
+        if not self.shared:
+            return nullcontext()
+        if self.file_lock is None:
+            self.file_lock = FileLock(self.lock_path())
+        return self.file_lock
+
+    def snapshot_lock(self):
+        # Does for the snapshot writers of several processes what write_lock
+        # does within one.
+        if not self.shared:
+            return nullcontext()
+        if self.snapshot_file_lock is None:
+            self.snapshot_file_lock = FileLock(self.journal_path + ".snapshot.lock")
+        return self.snapshot_file_lock
+
+    def hold_lock(self):
+        if self.file_lock is None:
+            lock = FileLock(self.lock_path())
+            lock.acquire(timeout=0)
+            self.file_lock = lock
+
+    def journal_stat(self):
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_dev, stat.st_ino, stat.st_size
+
+    def catch_up(self):
+        # Caller holds the ledger lock and self.lock. Applies the records other
+        # processes appended since this one last read the journal; if one of
+        # them compacted it in the meantime, reloads instead.
+        mark = self.journal_stat()
+        if mark == self.journal_mark:
+            return
+        if mark is None or self.journal_mark is None or mark[:2] != self.journal_mark[:2] or mark[2] < self.journal_mark[2]:
+            self.load()
+            return
+        records = []
+        with open(self.journal_path, "r") as file:
+            file.seek(self.journal_mark[2])
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn by a crashed writer; load() repairs the journal.
+                    self.load()
+                    return
+        for record in records:
+            if record["seq"] > self.seq:
+                if record["op"] == "reset":
+                    # Another process swapped in a whole new snapshot.
+                    self.load()
+                    return
+                apply_operation(self.transactions, record)
+                self.seq = record["seq"]
+                self.journal_count += 1
+        self.journal_mark = mark
+        self.version += 1
+
+    def refresh(self, timeout=LOCK_TIMEOUT):
+        # Picks up changes other processes made to a shared ledger. Raises
+        # TimeoutError if the ledger stays busy for longer than timeout.
+        if not self.shared or self.journal_stat() == self.journal_mark:
+            return
+        ledger_lock = self.ledger_lock()
+        ledger_lock.acquire(timeout)
+        try:
+            if not self.lock.acquire(timeout=timeout):
+                raise TimeoutError(f"{self.path} is busy")
+            try:
+                self.catch_up()
+            finally:
+                self.lock.release()
+        finally:
+            ledger_lock.release()
+
+    def write_snapshot(self, rows, seq):
+        write_json_rows(self.path, rows, seq)
+
+    def read_snapshot(self):
+        # Loads the snapshot into self.transactions and returns its seq.
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return 0
+        rows = data.get("transactions", [])
+        try:
+            self.transactions.extend(rows)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            # Older versions stored rows without validating them; load the
+            # rows that pass and set the rest aside instead of refusing the file.
+            self.transactions.clear()
+            valid, errors = validate_rows(rows)
+            self.transactions.extend(valid)
+            self.set_aside(rows, errors)
+        return data.get("seq", 0)
+
+    def set_aside(self, rows, errors):
+        self.rejected = [(position + 1, message) for position, message in errors]
+        with open(self.rejected_path, "w") as file:
+            json.dump({"transactions": [rows[position] for position, _ in errors]}, file)
+
+    def read_journal(self):
+        records = []
+        torn = False
+        try:
+            with open(self.journal_path, "r") as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A torn write from a crash can only be the last line.
+                        torn = True
+                        break
+        except FileNotFoundError:
+            pass
+        return records, torn
+
+    def rewrite_journal(self, records):
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.journal_path)
+        sync_directory(self.journal_path)
+
+    @timed("storage.write_journal")
+    def write_journal(self, records):
+        text = "".join(json.dumps(record) + "\n" for record in records)
+        with self.journal_lock, open(self.journal_path, "a") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        count("storage.write_journal", len(records), len(text))
+
+    def trim_journal(self, seq):
+        # Drops the records a snapshot at seq already covers.
+        with self.journal_lock:
+            records, _ = self.read_journal()
+            pending = [record for record in records if record["seq"] > seq]
+            self.rewrite_journal(pending)
+            self.journal_count = len(pending)
+            self.journal_mark = self.journal_stat()
+
+    def flush(self):
+        self.writer.flush()
+
+    def save_state(self):
+        return self.writer.state()
+
+    @timed("storage.load")
+    def load(self):
+        if not self.shared:
+            self.hold_lock()
+        with self.ledger_lock():
+            self.read_ledger()
+
+    def read_ledger(self):
+        # Queued records must reach the journal before it is replayed.
+        self.flush()
+        self.transactions.clear()
+        self.rejected = []
+        snapshot_seq = self.read_snapshot()
+
+        with self.journal_lock:
+            records, torn = self.read_journal()
+            if torn:
+                self.rewrite_journal(records)
+            self.journal_mark = self.journal_stat()
+
+        self.seq = self.written_seq = snapshot_seq
+        self.journal_count = 0
+        for record in records:
+            if record["seq"] <= snapshot_seq:
+                continue
+            apply_operation(self.transactions, record)
+            self.seq = record["seq"]
+            self.journal_count += 1
+        self.version += 1
+        count("storage.load", len(self.transactions))
+
+    @timed("storage.save")
+    def save(self):
+        self.checkpoint(always=True)
+
+    @timed("storage.compact")
+    def compact(self):
+        try:
+            self.checkpoint(always=False)
+        finally:
+            self.compacting = False
+
+    def checkpoint(self, always):
+        # Writes the current rows as the snapshot and drops the journal records
+        # it covers. The ledger lock is held only to copy the rows and to trim
+        # the journal; while the snapshot is written, edits carry on and only
+        # other snapshot writers wait.
+        with self.write_lock, self.snapshot_lock():
+            with self.ledger_lock(), self.lock:
+                if self.shared:
+                    self.catch_up()
+                rows = self.transactions.copy()
+                seq = self.seq
+            if always or seq > self.written_seq:
+                self.write_snapshot(rows, seq)
+                self.written_seq = seq
+            with self.ledger_lock(), self.lock:
+                if self.shared:
+                    # Keep what other processes appended while the snapshot was written.
+                    self.catch_up()
+                self.trim_journal(seq)
+
+    def append_journal(self, record):
+        # Caller must hold self.lock so the in-memory change and its record stay in step.
+        self.seq += 1
+        record["seq"] = self.seq
+        self.writer.submit(record)
+        self.journal_count += 1
+        if self.needs_compaction() and not self.compacting:
+            self.compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def needs_compaction(self):
+        return self.journal_count >= COMPACT_THRESHOLD
+
+    def apply_batch(self, operations):
+        with self.ledger_lock(), self.lock:
+            if self.shared:
+                self.catch_up()
+            check_operations(operations, len(self.transactions))
+            try:
+                for operation in operations:
+                    apply_operation(self.transactions, operation)
+                if len(operations) == 1:
+                    self.append_journal(dict(operations[0]))
+                else:
+                    # One journal line, so a crash keeps all of the batch or none of it.
+                    self.append_journal({"op": "batch", "ops": operations})
+                self.version += 1
+            except Exception:
+                # Back to the last durable state.
+                self.load()
+                raise
+            if self.shared:
+                # Other processes must find the change on disk once the lock is free.
+                self.flush()
+                self.journal_mark = self.journal_stat()
+
+    def batch(self):
+        return Batch(self)
+
+    def cached(self, key, compute):
+        # Returns compute()'s result, reusing it until the ledger next changes.
+        return self.queries.get(key, self.version, compute)
+
+    def add(self, transaction):
+        self.apply_batch([{"op": "add", "transaction": transaction}])
+
+    def update(self, index, transaction):
+        self.apply_batch([{"op": "update", "index": index, "transaction": transaction}])
+
+    def delete(self, index):
+        self.apply_batch([{"op": "delete", "index": index}])
+
+    def extend(self, batch):
+        self.apply_batch([{"op": "extend", "transactions": batch}])
+
+    def extend_columns(self, columns):
+        self.apply_batch([{"op": "extend_columns", "columns": columns}])
+
+    def clear(self):
+        self.apply_batch([{"op": "clear"}])
+
+    def replace_columns(self, batches):
+        # Replaces every row with those of batches (column dicts, as
+        # extend_columns takes). The rows go into a new snapshot instead of
+        # the journal, which only gets a reset record; until the snapshot is
+        # swapped in, a failure leaves the old ledger as it was.
+        rows = TransactionStore()
+        for columns in batches:
+            rows.extend_columns(columns)
+        with self.write_lock, self.snapshot_lock(), self.ledger_lock(), self.lock:
+            if self.shared:
+                self.catch_up()
+            self.write_snapshot(rows, self.seq + 1)
+            self.written_seq = self.seq + 1
+            self.transactions.adopt(rows)
+            self.append_journal({"op": "reset"})
+            self.version += 1
+            if self.shared:
+                self.flush()
+                self.journal_mark = self.journal_stat()
+
+    def close(self):
+        self.flush()
+        if not self.shared and self.file_lock is not None:
+            self.file_lock.release()
+            self.file_lock = None
+
+
+def read_json_ledger(path):
+    # Reads a JSON ledger, snapshot plus journal, for migrating it to another
+    # format. Nothing is locked, repaired or started, so no lock file or
+    # writer thread is left behind; if a compaction replaces the snapshot
+    # while it is being read, the ledger is read again.
+    def snapshot_stat():
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    while True:
+        ledger = JsonStorage(path)
+        before = snapshot_stat()
+        seq = ledger.read_snapshot()
+        records, _ = ledger.read_journal()
+        if snapshot_stat() == before:
+            break
+    for record in records:
+        if record["seq"] > seq:
+            apply_operation(ledger.transactions, record)
+    return ledger
+
+
+@timed("storage.write_binary")
+def write_binary_snapshot(path, rows, seq):
+    names = json.dumps(rows.category_names).encode()
+    columns = (rows.amounts, rows.dates, rows.categories, rows.types)
+    if sys.byteorder == "big":
+        columns = [_swapped(typecode, column) for typecode, column in zip("diI", columns[:3])] + [rows.types]
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(rows), seq, len(names))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(header.ljust(SNAPSHOT_HEADER_SIZE, b"\0"))
+        for column in columns:
+            file.write(column)
+        file.write(names)
+        file.flush()
+        os.fsync(file.fileno())
+        count("storage.write_binary", len(rows), file.tell())
+    os.replace(tmp_path, path)
+    sync_directory(path)
+
+def read_binary_snapshot(path, store):
+    # Points store at the mapped columns of the snapshot and returns its seq.
+    import mmap
+
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapping)
+    magic, version, _, row_count, seq, names_size = SNAPSHOT_HEADER.unpack_from(view)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a transaction snapshot")
+    if version > SNAPSHOT_VERSION:
+        raise ValueError(f"{path} uses snapshot format {version}; this version reads up to {SNAPSHOT_VERSION}")
+
+    offset = SNAPSHOT_HEADER_SIZE
+    columns = []
+    for typecode, size in (("d", 8 * row_count), ("i", 4 * row_count), ("I", 4 * row_count),
+                           ("B", (row_count + 7) // 8)):
+        columns.append(view[offset:offset + size].cast(typecode))
+        offset += size
+    names = json.loads(bytes(view[offset:offset + names_size]))
+    amounts, dates, categories, types = columns
+    store.use_buffers(amounts, categories, dates, types, names)
+    if sys.byteorder == "big" or os.name == "nt":
+        # Big-endian hosts need the columns swapped, and Windows cannot
+        # replace or delete a file that is still mapped, so both read into arrays.
+        store.materialize()
+        if sys.byteorder == "big":
+            for column in (store.amounts, store.dates, store.categories):
+                column.byteswap()
+    return seq
+
+def _swapped(typecode, column):
+    column = copy_column(typecode, column)
+    column.byteswap()
+    return column
+
+
+class BinaryStorage(JsonStorage):
+    # Same journal and compaction as JsonStorage, but the snapshot is a
+    # fixed-width column file that is memory-mapped on load, so opening a
+    # ledger does not parse or allocate anything per row.
+    def __init__(self, path, migrate_from=TRANSACTIONS_FILE, shared=False):
+        super().__init__(path, shared)
+        self.journal_path = path + ".journal"
+        self.migrate_from = migrate_from
+
+    def write_snapshot(self, rows, seq):
+        write_binary_snapshot(self.path, rows, seq)
+
+    def read_snapshot(self):
+        try:
+            return read_binary_snapshot(self.path, self.transactions)
+        except FileNotFoundError:
+            return self.migrate()
+
+    def migrate(self):
+        # First use: carry over the existing JSON ledger, snapshot plus journal.
+        if not self.migrate_from or not os.path.exists(self.migrate_from):
+            return 0
+        source = read_json_ledger(self.migrate_from)
+        self.rejected, self.rejected_path = source.rejected, source.rejected_path
+        self.transactions.extend(source.transactions.rows())
+        self.write_snapshot(self.transactions, 0)
+        return 0
+
+
+def partition_summary(partition):
+    summary = partition.ensure_aggregates()
+    names = partition.category_names
+    return {
+        "count": len(partition),
+        "incomes": sum(partition.income_mask()),
+        "totals": summary.totals,
+        "categories": {names[code]: totals for code, totals in summary.by_category.items()},
+        "months": summary.by_month,
+    }
+
+
+class PartitionedRows:
+    # Concatenates per-partition search results without copying them.
+    def __init__(self, chunks):
+        self.chunks = [chunk for chunk in chunks if len(chunk)]
+        self.starts = []
+        total = 0
+        for chunk in self.chunks:
+            self.starts.append(total)
+            total += len(chunk)
+        self.count = total
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[position] for position in range(self.count)[item]]
+        if item < 0:
+            item += self.count
+        if not 0 <= item < self.count:
+            raise IndexError("transaction index out of range")
+        chunk = bisect_right(self.starts, item) - 1
+        return self.chunks[chunk][item - self.starts[chunk]]
+
+
+class PartitionedMatches:
+    # Ranked text search results as (partition, position) pairs.
+    def __init__(self, matches):
+        self.matches = matches
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [partition.get_row(position) for partition, position in self.matches[item]]
+        partition, position = self.matches[item]
+        return partition.get_row(position)
+
+
+def _keyed_positions(partition, field, reverse):
+    key = partition.sort_key(field)
+    order = partition.sort_order(field)
+    for position in (reversed(order) if reverse else order):
+        yield key(position), partition, position
+
+
+class PartitionedSortedView:
+    # Date order is partition order, so date pages only load the partitions
+    # they reach. Amount and category orders merge every partition's sorted
+    # order. Rows are produced lazily and kept once a page has asked for them.
+    def __init__(self, store, field, reverse=False):
+        if field not in ("amount", "date", "category"):
+            raise ValueError(f"Unknown sort field {field!r}")
+        self.store = store
+        self.field = field
+        self.reverse = reverse
+        self.rows = []
+        self.source = self.iterate()
+
+    def iterate(self):
+        keys = list(reversed(self.store.keys)) if self.reverse else list(self.store.keys)
+        streams = (_keyed_positions(self.store.partition(key), self.field, self.reverse) for key in keys)
+        if self.field == "date":
+            merged = chain.from_iterable(streams)
+        else:
+            merged = heapq.merge(*streams, key=itemgetter(0), reverse=self.reverse)
+        for _, partition, position in merged:
+            yield partition.get_row(position)
+
+    def fill(self, stop):
+        self.rows.extend(islice(self.source, max(0, stop - len(self.rows))))
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self.store))
+            self.fill(stop)
+            return self.rows[start:stop:step]
+        if item < 0:
+            item += len(self.store)
+        self.fill(item + 1)
+        if not 0 <= item < len(self.rows):
+            raise IndexError("transaction index out of range")
+        return self.rows[item]
+
+
+class PartitionedAggregates:
+    # Clean partitions contribute the totals cached in the manifest, so a
+    # summary never loads old periods; only partitions with unsaved changes
+    # are summarized from memory.
+    def __init__(self, store):
+        self.totals = [0.0, 0.0, 0]
+        self.by_category = {}
+        self.by_month = {}
+        for key in store.keys:
+            summary = partition_summary(store.loaded[key]) if key in store.dirty else store.entries[key]
+            self._merge(self.totals, summary["totals"])
+            for table, groups in ((self.by_category, summary["categories"]), (self.by_month, summary["months"])):
+                for name, totals in groups.items():
+                    self._merge(table.setdefault(name, [0.0, 0.0, 0]), totals)
+
+    @staticmethod
+    def _merge(totals, other):
+        for slot in range(3):
+            totals[slot] += other[slot]
+
+    @property
+    def income(self):
+        return self.totals[1]
+
+    @property
+    def expenses(self):
+        return self.totals[0]
+
+    @property
+    def net(self):
+        return self.totals[1] - self.totals[0]
+
+    def category_totals(self):
+        return sorted((name, income, expenses) for name, (expenses, income, count) in self.by_category.items() if count)
+
+    def month_totals(self):
+        return sorted((month, income, expenses) for month, (expenses, income, count) in self.by_month.items() if count)
+
+
+class PartitionedStore:
+    # Same sequence interface as TransactionStore over a directory of
+    # per-period partitions. Positions run through the partitions in date
+    # order. Partitions load on first use and the least recently used clean
+    # ones are dropped once the loaded rows pass cache_bytes; partitions with
+    # changes that are only in the journal stay loaded until compaction.
+    def __init__(self, directory, period="month", cache_bytes=PARTITION_CACHE_BYTES):
+        self.directory = directory
+        self.cache_bytes = cache_bytes
+        self.reset({}, period)
+
+    def reset(self, entries, period):
+        if period not in PERIOD_LENGTHS:
+            raise ValueError(f"Unknown partition period {period!r}")
+        self.period = period
+        self.key_length = PERIOD_LENGTHS[period]
+        self.entries = dict(entries)
+        self.counts = {key: entry["count"] for key, entry in entries.items()}
+        self.keys = sorted(self.counts)
+        self.count = sum(self.counts.values())
+        self.loaded = OrderedDict()
+        # Partition key -> number of changes since it was last written.
+        self.dirty = {}
+        self.starts = None
+
+    def key_of(self, transaction):
+        return transaction["date"][:self.key_length]
+
+    def partition(self, key):
+        partition = self.loaded.get(key)
+        if partition is not None:
+            self.loaded.move_to_end(key)
+            return partition
+        partition = TransactionStore()
+        if key in self.entries:
+            read_binary_snapshot(os.path.join(self.directory, self.entries[key]["file"]), partition)
+        elif key not in self.counts:
+            insort(self.keys, key)
+            self.counts[key] = 0
+            self.starts = None
+        self.loaded[key] = partition
+        self.evict()
+        return partition
+
+    def evict(self):
+        loaded_bytes = sum(map(len, self.loaded.values())) * PARTITION_ROW_BYTES
+        newest = next(reversed(self.loaded), None)
+        for key in list(self.loaded):
+            if loaded_bytes <= self.cache_bytes:
+                break
+            if key in self.dirty or key == newest:
+                continue
+            loaded_bytes -= len(self.loaded.pop(key)) * PARTITION_ROW_BYTES
+
+    def dirty_rows(self):
+        return sum(len(self.loaded[key]) for key in self.dirty)
+
+    def _changed(self, key, delta=0):
+        self.dirty[key] = self.dirty.get(key, 0) + 1
+        if delta:
+            self.counts[key] += delta
+            self.count += delta
+            self.starts = None
+
+    def locate(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("transaction index out of range")
+        if self.starts is None:
+            self.starts = []
+            total = 0
+            for key in self.keys:
+                self.starts.append(total)
+                total += self.counts[key]
+        # bisect_right skips empty partitions that share a start with the next one.
+        slot = bisect_right(self.starts, index) - 1
+        return self.keys[slot], index - self.starts[slot]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for key in list(self.keys):
+            yield from self.partition(key).rows()
+
+    def rows(self):
+        return iter(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(self.count)[index]]
+        key, position = self.locate(index)
+        return self.partition(key).get_row(position)
+
+    def __setitem__(self, index, transaction):
+        key, position = self.locate(index)
+        new_key = self.key_of(transaction)
+        if new_key == key:
+            self.partition(key)[position] = transaction
+            self._changed(key)
+            return
+        del self.partition(key)[position]
+        self._changed(key, -1)
+        self.append(transaction)
+
+    def __delitem__(self, index):
+        key, position = self.locate(index)
+        del self.partition(key)[position]
+        self._changed(key, -1)
+
+    def append(self, transaction):
+        key = self.key_of(transaction)
+        self.partition(key).append(transaction)
+        self._changed(key, 1)
+
+    def extend(self, rows):
+        grouped = {}
+        for transaction in rows:
+            grouped.setdefault(self.key_of(transaction), []).append(transaction)
+        for key, group in grouped.items():
+            self.partition(key).extend(group)
+            self._changed(key, len(group))
+
+    def extend_columns(self, columns):
+        grouped = {}
+        for position, date in enumerate(columns["date"]):
+            grouped.setdefault(date[:self.key_length], []).append(position)
+        for key, positions in grouped.items():
+            self.partition(key).extend_columns({field: [columns[field][position] for position in positions]
+                                                for field in FIELDS})
+            self._changed(key, len(positions))
+
+    def clear(self):
+        self.reset({}, self.period)
+
+    def ensure_aggregates(self):
+        return PartitionedAggregates(self)
+
+    def _may_contain(self, key, field, value):
+        if key in self.dirty:
+            return True
+        entry = self.entries[key]
+        if field == "category":
+            return any(name.lower() == value for name in entry["categories"])
+        incomes = entry["incomes"]
+        return bool(incomes if value == "income" else entry["count"] - incomes)
+
+    @timed("store.search", rows=len)
+    def search(self, field, value):
+        value = value.strip().lower()
+        if field == "date":
+            bounds = parse_date_query(value)
+            if bounds is None:
+                return []
+            first, last = (ordinal_to_date(ordinal)[:self.key_length] for ordinal in bounds)
+            keys = self.keys[bisect_left(self.keys, first):bisect_right(self.keys, last)]
+        elif field == "category":
+            keys = [key for key in self.keys if self._may_contain(key, field, value)]
+        elif field == "type":
+            if value not in ("income", "expense"):
+                return []
+            keys = [key for key in self.keys if self._may_contain(key, field, value)]
+        else:
+            raise ValueError(f"Unknown search field {field!r}")
+        return PartitionedRows([self.partition(key).search(field, value) for key in keys])
+
+    @timed("store.text_search", rows=len)
+    def text_search(self, text, amount_range="", date_range=""):
+        # Partitions are skipped when the manifest shows they have no matching
+        # category or lie outside the date range. Scores depend only on the
+        # category name, so each partition's rows for a score can be appended
+        # in partition order.
+        amounts, dates = parse_text_filters(amount_range, date_range)
+        keys = self.keys
+        if dates is not None:
+            first, last = (ordinal_to_date(ordinal)[:self.key_length] for ordinal in dates)
+            keys = keys[bisect_left(keys, first):bisect_right(keys, last)]
+        query = text.strip().lower()
+        if query:
+            keys = [key for key in keys if key in self.dirty
+                    or any(score_text(query, name.lower()) is not None for name in self.entries[key]["categories"])]
+        groups = {}
+        for key in keys:
+            partition = self.partition(key)
+            for score, positions in partition.text_matches(text, amounts, dates):
+                groups.setdefault(score, []).extend(zip(repeat(partition), positions))
+        return PartitionedMatches([match for score in sorted(groups, reverse=True) for match in groups[score]])
+
+    def sorted_view(self, field="amount", reverse=False):
+        return PartitionedSortedView(self, field, reverse)
+
+    def snapshot(self):
+        # Copies the partitions that changed, with their change counters, so
+        # they can be written out without holding the storage lock.
+        dirty = {key: (changes, self.loaded[key].copy()) for key, changes in self.dirty.items()}
+        clean = {key: self.entries[key] for key in self.keys if key not in self.dirty}
+        return dirty, clean
+
+    def mark_written(self, written, seq):
+        for key, (changes, entry) in written.items():
+            if key not in self.counts:
+                continue
+            current = self.entries.get(key)
+            if current is not None and current.get("seq", 0) > seq:
+                # A later write already replaced this partition's file.
+                continue
+            if entry is None:
+                self.entries.pop(key, None)
+            else:
+                self.entries[key] = entry
+            if self.dirty.get(key) != changes:
+                continue
+            del self.dirty[key]
+            if entry is None:
+                # Emptied and written out: the partition is gone.
+                self.keys.remove(key)
+                del self.counts[key]
+                self.loaded.pop(key, None)
+                self.starts = None
+        self.evict()
+
+
+class PartitionedStorage(JsonStorage):
+    # A directory with one binary snapshot per month (or year), a manifest
+    # and a journal. Loading reads only the manifest and replays the journal;
+    # compaction rewrites just the partitions that changed.
+    def __init__(self, path, migrate_from=TRANSACTIONS_FILE, period="month", cache_bytes=PARTITION_CACHE_BYTES,
+                 shared=False):
+        if shared:
+            # Another process's compaction deletes partition files this one
+            # may not have loaded yet; several users should go through a server.
+            raise ValueError("Date-partitioned ledgers cannot be shared between processes; "
+                             "serve them with 'Finance_Tracker.py serve' instead")
+        super().__init__(path, shared=False)
+        self.manifest_path = os.path.join(path, MANIFEST_FILE)
+        self.journal_path = os.path.join(path, "journal")
+        self.migrate_from = migrate_from
+        self.period = period
+        self.transactions = PartitionedStore(path, period, cache_bytes)
+
+    def read_snapshot(self):
+        try:
+            with open(self.manifest_path, "r") as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return self.migrate()
+        if manifest.get("version", 0) > MANIFEST_VERSION:
+            raise ValueError(f"{self.manifest_path} uses manifest format {manifest['version']}; "
+                             f"this version reads up to {MANIFEST_VERSION}")
+        self.transactions.reset(manifest["partitions"], manifest["period"])
+        self.written_seq = manifest["seq"]
+        return manifest["seq"]
+
+    def write_partitions(self, snapshot, seq):
+        dirty, clean = snapshot
+        entries = dict(clean)
+        written = {}
+        for key, (changes, partition) in dirty.items():
+            entry = None
+            if len(partition):
+                entry = partition_summary(partition)
+                entry["file"] = f"{key}.{seq}.snap"
+                entry["seq"] = seq
+                write_binary_snapshot(os.path.join(self.path, entry["file"]), partition, seq)
+                entries[key] = entry
+            written[key] = (changes, entry)
+
+        manifest = {"version": MANIFEST_VERSION, "period": self.transactions.period, "seq": seq,
+                    "partitions": entries}
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        sync_directory(self.manifest_path)
+        self.written_seq = seq
+        return written
+
+    def finish_write(self, written, seq):
+        # Caller holds self.lock and, outside of load, self.write_lock. Old
+        # partition files are removed only once nothing, on disk or in memory,
+        # refers to them any more.
+        self.transactions.mark_written(written, seq)
+        keep = {entry["file"] for entry in self.transactions.entries.values()}
+        for name in os.listdir(self.path):
+            if name.endswith(".snap") and name not in keep:
+                os.remove(os.path.join(self.path, name))
+
+    def migrate(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.transactions.reset({}, self.period)
+        if self.migrate_from and os.path.exists(self.migrate_from):
+            source = read_json_ledger(self.migrate_from)
+            self.rejected, self.rejected_path = source.rejected, source.rejected_path
+            self.transactions.extend(source.transactions.rows())
+        self.finish_write(self.write_partitions(self.transactions.snapshot(), 0), 0)
+        return 0
+
+    def checkpoint(self, always):
+        # write_lock is held until the manifest, the in-memory entries and
+        # the partition files agree, so a save cannot slip in between.
+        with self.write_lock:
+            with self.lock:
+                snapshot = self.transactions.snapshot()
+                seq = self.seq
+            if not always and seq < self.written_seq:
+                # A save already wrote a newer state.
+                return
+            written = self.write_partitions(snapshot, seq)
+            with self.lock:
+                self.finish_write(written, seq)
+                self.trim_journal(seq)
+
+    def replace_columns(self, batches):
+        # The new partitions only become the ledger once the manifest naming
+        # them is written, so a failure before then leaves the old one intact.
+        with self.write_lock, self.lock:
+            try:
+                self.transactions.clear()
+                for columns in batches:
+                    self.transactions.extend_columns(columns)
+                seq = self.seq + 1
+                self.finish_write(self.write_partitions(self.transactions.snapshot(), seq), seq)
+            except Exception:
+                self.load()
+                raise
+            self.append_journal({"op": "reset"})
+            self.version += 1
+
+    def needs_compaction(self):
+        # Changed partitions are pinned in memory, so they also count against the cache.
+        return (super().needs_compaction()
+                or self.transactions.dirty_rows() * PARTITION_ROW_BYTES > self.transactions.cache_bytes)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('Income', 'Expense')),
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS transactions_type ON transactions (type);
+CREATE INDEX IF NOT EXISTS transactions_amount ON transactions (amount);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+SELECT_ROWS = "SELECT amount, category, type, date FROM transactions"
+ID_AT = "SELECT id FROM transactions ORDER BY id LIMIT 1 OFFSET ?"
+INSERT_ROW = "INSERT INTO transactions (amount, category, type, date) VALUES (?, ?, ?, ?)"
+SORT_COLUMNS = {"amount": "amount", "date": "date", "category": "category COLLATE NOCASE"}
+
+def encode_row(transaction):
+    validate_transaction(transaction)
+    return float(transaction["amount"]), transaction["category"], transaction["type"], transaction["date"]
+
+def decode_rows(rows):
+    return [dict(zip(FIELDS, row)) for row in rows]
+
+
+class SqliteSortedView:
+    def __init__(self, store, field, reverse=False):
+        if field not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort field {field!r}")
+        direction = "DESC" if reverse else "ASC"
+        self.store = store
+        self.query = f"{SELECT_ROWS} ORDER BY {SORT_COLUMNS[field]} {direction}, id {direction} LIMIT ? OFFSET ?"
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, _ = item.indices(len(self.store))
+            return decode_rows(self.store.conn.execute(self.query, (max(0, stop - start), start)))
+        if item < 0:
+            item += len(self.store)
+        rows = decode_rows(self.store.conn.execute(self.query, (1, item)))
+        if not rows:
+            raise IndexError("transaction index out of range")
+        return rows[0]
+
+
+class SqliteAggregates:
+    def __init__(self, conn):
+        self.conn = conn
+        totals = dict(conn.execute("SELECT type, TOTAL(amount) FROM transactions GROUP BY type"))
+        self.income = totals.get("Income", 0.0)
+        self.expenses = totals.get("Expense", 0.0)
+        self.net = self.income - self.expenses
+
+    def _grouped(self, key):
+        return list(self.conn.execute(
+            f"SELECT {key} AS name, "
+            "TOTAL(CASE WHEN type = 'Income' THEN amount END), "
+            "TOTAL(CASE WHEN type = 'Expense' THEN amount END) "
+            "FROM transactions GROUP BY name ORDER BY name"))
+
+    def category_totals(self):
+        return self._grouped("category")
+
+    def month_totals(self):
+        return self._grouped("substr(date, 1, 7)")
+
+
+class SqliteTransactionStore:
+    # Same sequence interface as TransactionStore, with every query answered
+    # by SQLite instead of Python. Positions are ranks in id order. Writes are
+    # left uncommitted; SqliteStorage wraps them in a transaction.
+    def __init__(self, conn):
+        self.conn = conn
+        self.count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for row in self.conn.execute(f"{SELECT_ROWS} ORDER BY id"):
+            yield dict(zip(FIELDS, row))
+
+    def rows(self):
+        return iter(self)
+
+    def _id_at(self, index):
+        if index < 0:
+            index += self.count
+        row = self.conn.execute(ID_AT, (index,)).fetchone() if index >= 0 else None
+        if row is None:
+            raise IndexError("transaction index out of range")
+        return row[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(self.count)
+            return decode_rows(self.conn.execute(f"{SELECT_ROWS} ORDER BY id LIMIT ? OFFSET ?",
+                                                 (max(0, stop - start), start)))
+        row_id = self._id_at(index)
+        return decode_rows(self.conn.execute(f"{SELECT_ROWS} WHERE id = ?", (row_id,)))[0]
+
+    def __setitem__(self, index, transaction):
+        values = encode_row(transaction)
+        self.conn.execute("UPDATE transactions SET amount = ?, category = ?, type = ?, date = ? WHERE id = ?",
+                          values + (self._id_at(index),))
+
+    def __delitem__(self, index):
+        self.conn.execute("DELETE FROM transactions WHERE id = ?", (self._id_at(index),))
+        self.count -= 1
+
+    def append(self, transaction):
+        values = encode_row(transaction)
+        self.conn.execute(INSERT_ROW, values)
+        self.count += 1
+
+    def extend(self, rows):
+        values = [encode_row(transaction) for transaction in rows]
+        self.conn.executemany(INSERT_ROW, values)
+        self.count += len(values)
+
+    def extend_columns(self, columns):
+        check_columns(columns)
+        self.conn.executemany(INSERT_ROW, zip(map(float, columns["amount"]), columns["category"], columns["type"],
+                                              columns["date"]))
+        self.count += len(columns["amount"])
+
+    def clear(self):
+        self.conn.execute("DELETE FROM transactions")
+        self.count = 0
+
+    def ensure_aggregates(self):
+        return SqliteAggregates(self.conn)
+
+    @timed("store.search", rows=len)
+    def search(self, field, value):
+        value = value.strip()
+        if field == "category":
+            rows = self.conn.execute(f"{SELECT_ROWS} WHERE category = ? COLLATE NOCASE ORDER BY id", (value,))
+        elif field == "type":
+            rows = self.conn.execute(f"{SELECT_ROWS} WHERE type = ? ORDER BY id", (value.capitalize(),))
+        elif field == "date":
+            bounds = parse_date_query(value)
+            if bounds is None:
+                return []
+            rows = self.conn.execute(f"{SELECT_ROWS} WHERE date BETWEEN ? AND ? ORDER BY date, id",
+                                     (ordinal_to_date(bounds[0]), ordinal_to_date(bounds[1])))
+        else:
+            raise ValueError(f"Unknown search field {field!r}")
+        return decode_rows(rows)
+
+    @timed("store.text_search", rows=len)
+    def text_search(self, text, amount_range="", date_range=""):
+        (low, high), dates = parse_text_filters(amount_range, date_range)
+        names = [name for (name,) in self.conn.execute("SELECT DISTINCT category FROM transactions")]
+        scores = {names[key]: score for key, score in TrigramIndex(enumerate(names)).match(text).items()}
+        if not scores:
+            return []
+        clauses = [f"category IN ({', '.join('?' * len(scores))})"]
+        params = list(scores)
+        if low is not None:
+            clauses.append("amount >= ?")
+            params.append(low)
+        if high is not None:
+            clauses.append("amount <= ?")
+            params.append(high)
+        if dates is not None:
+            clauses.append("date BETWEEN ? AND ?")
+            params.extend(map(ordinal_to_date, dates))
+        rows = decode_rows(self.conn.execute(f"{SELECT_ROWS} WHERE {' AND '.join(clauses)} ORDER BY id", params))
+        # sort() is stable, so rows keep their order within a score.
+        rows.sort(key=lambda row: -scores[row["category"]])
+        return rows
+
+    def sorted_view(self, field="amount", reverse=False):
+        return SqliteSortedView(self, field, reverse)
+
+
+class SqliteStorage:
+    # SQLite does its own locking between processes, so shared is accepted
+    # only for symmetry with the file backends: every batch runs in an
+    # IMMEDIATE transaction and first picks up other connections' commits.
+    def __init__(self, path, migrate_from=TRANSACTIONS_FILE, shared=False):
+        self.path = path
+        self.migrate_from = migrate_from
+        self.shared = shared
+        self.conn = None
+        self.transactions = None
+        self.lock = threading.Lock()
+        self.version = 0
+        self.data_version = None
+        self.queries = QueryCache()
+        self.rejected = []
+        self.rejected_path = None
+
+    @timed("storage.load")
+    def load(self):
+        if self.conn is None:
+            import sqlite3
+
+            # The connection is shared with the GUI's search thread; self.lock
+            # serializes access.
+            self.conn = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            self.migrate()
+        self.transactions = SqliteTransactionStore(self.conn)
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.version += 1
+
+    def catch_up(self):
+        # data_version changes whenever another connection commits.
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return False
+        self.data_version = data_version
+        self.transactions.count = self.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        self.version += 1
+        return True
+
+    def refresh(self, timeout=LOCK_TIMEOUT):
+        if not self.lock.acquire(timeout=timeout):
+            raise TimeoutError(f"{self.path} is busy")
+        try:
+            self.catch_up()
+        finally:
+            self.lock.release()
+
+    def migrate(self):
+        # One-time import of the JSON ledger the first time the database is opened.
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+            return
+        with self.conn:
+            # Checked again under the write lock in case another process got there first.
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+                return
+            empty = self.conn.execute("SELECT 1 FROM transactions LIMIT 1").fetchone() is None
+            if empty and self.migrate_from and os.path.exists(self.migrate_from):
+                source = read_json_ledger(self.migrate_from)
+                self.rejected, self.rejected_path = source.rejected, source.rejected_path
+                self.conn.executemany(INSERT_ROW, (encode_row(row) for row in source.transactions.rows()))
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', ?)", (self.migrate_from,))
+
+    @timed("storage.save")
+    def save(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def flush(self):
+        # Every batch is committed by apply_batch itself; nothing is queued.
+        pass
+
+    def save_state(self):
+        return "saved"
+
+    def apply_batch(self, operations):
+        with self.lock:
+            try:
+                with self.conn:
+                    # Taken up front so positions cannot shift under the batch.
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    self.catch_up()
+                    check_operations(operations, len(self.transactions))
+                    for operation in operations:
+                        apply_operation(self.transactions, operation)
+            except Exception:
+                self.transactions.count = self.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+                raise
+            finally:
+                self.version += 1
+
+    def batch(self):
+        return Batch(self)
+
+    def cached(self, key, compute):
+        # Returns compute()'s result, reusing it until the ledger next changes.
+        return self.queries.get(key, self.version, compute)
+
+    def add(self, transaction):
+        self.apply_batch([{"op": "add", "transaction": transaction}])
+
+    def update(self, index, transaction):
+        self.apply_batch([{"op": "update", "index": index, "transaction": transaction}])
+
+    def delete(self, index):
+        self.apply_batch([{"op": "delete", "index": index}])
+
+    def extend(self, batch):
+        self.apply_batch([{"op": "extend", "transactions": batch}])
+
+    def extend_columns(self, columns):
+        self.apply_batch([{"op": "extend_columns", "columns": columns}])
+
+    def clear(self):
+        self.apply_batch([{"op": "clear"}])
+
+    def replace_columns(self, batches):
+        # One transaction, so other connections see either the old rows or all the new ones.
+        with self.lock:
+            try:
+                with self.conn:
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    self.catch_up()
+                    self.transactions.clear()
+                    for columns in batches:
+                        self.transactions.extend_columns(columns)
+            except Exception:
+                self.transactions.count = self.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+                raise
+            finally:
+                self.version += 1
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import Finance_Tracker
+from Finance_Tracker import import_transactions, iter_csv_columns, iter_json_lines, iter_json_transactions
+
+
+def row(amount, category="Food", type_="Expense", date="2024-01-05"):
+    return {"amount": amount, "category": category, "type": type_, "date": date}
+
+
+def amounts(store):
+    return [r["amount"] for r in store]
+
+
+class StreamingReaderTests(unittest.TestCase):
+    def test_json_streams_only_the_top_level_transactions(self):
+        text = json.dumps({"meta": {"note": "transactions"}, "transactions": [row(1), row(2)], "after": 1})
+        self.assertEqual(amounts(iter_json_transactions(io.StringIO(text), chunk_size=7)), [1, 2])
+
+    def test_json_accepts_a_bare_list(self):
+        text = " [ 10 , 12.5 ] "
+        self.assertEqual(list(iter_json_transactions(io.StringIO(text), chunk_size=3)), [10, 12.5])
+
+    def test_json_requires_one_comma_between_rows(self):
+        for text in ("[1 2]", "[1,,2]", "[1,2,]", '{"transactions": [1, 2', '{"a": 1,}'):
+            with self.assertRaises(ValueError, msg=text):
+                list(iter_json_transactions(io.StringIO(text), chunk_size=4))
+
+    def test_json_lines_skip_blank_lines_and_reject_bad_ones(self):
+        text = json.dumps(row(1)) + "\n\n" + json.dumps(row(2)) + "\n"
+        self.assertEqual(amounts(iter_json_lines(io.StringIO(text), batch_size=2)), [1, 2])
+        with self.assertRaises(ValueError):
+            list(iter_json_lines(io.StringIO(json.dumps(row(1)) + "\n{oops\n")))
+
+    def test_csv_columns_in_batches(self):
+        text = "date,amount,category,type\n2024-01-05,1.50,Food,Expense\n\n2024-01-06,2\n"
+        self.assertEqual(list(iter_csv_columns(io.StringIO(text), 2)),
+                         [[["1.50"], ["Food"], ["Expense"], ["2024-01-05"]],
+                          [["2"], [None], [None], ["2024-01-06"]]])
+
+
+class ImportTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.previous = Finance_Tracker.storage
+        self.open_ledger()
+
+    def tearDown(self):
+        Finance_Tracker.storage.close()
+        Finance_Tracker.storage = self.previous
+        Finance_Tracker.transactions = self.previous.transactions
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open_ledger(self):
+        Finance_Tracker.use_storage(self.path("transactions.json"))
+        Finance_Tracker.load_transactions()
+
+    def reopen_ledger(self):
+        Finance_Tracker.storage.close()
+        self.open_ledger()
+
+    def write(self, name, text):
+        with open(self.path(name), "w") as file:
+            file.write(text)
+        return self.path(name)
+
+    def test_append_reports_row_errors_and_progress(self):
+        lines = [row(1), row(2, type_="Expens"), row(3, date="2024-02-30"), row(4)]
+        filename = self.write("rows.jsonl", "".join(json.dumps(r) + "\n" for r in lines))
+        reports = []
+        added, skipped, errors = import_transactions(filename, batch_size=2,
+                                                     progress=lambda *report: reports.append(report))
+        self.assertEqual((added, skipped), (2, 0))
+        self.assertEqual([number for number, _ in errors], [2, 3])
+        self.assertEqual(amounts(Finance_Tracker.transactions), [1.0, 4.0])
+        self.assertEqual([rows for rows, _, _ in reports], [2, 4])
+        self.assertEqual(reports[-1][1], reports[-1][2])
+
+    def test_merge_skips_rows_already_present(self):
+        Finance_Tracker.storage.add(row(1.0))
+        filename = self.write("rows.csv", "amount,category,type,date\n"
+                                          "1.00,Food,Expense,2024-01-05\n2,Food,Expense,2024-01-05\n"
+                                          "2,Food,expense,2024-01-05\n")
+        self.assertEqual(import_transactions(filename, "merge"), (1, 2, []))
+        self.assertEqual(amounts(Finance_Tracker.transactions), [1.0, 2.0])
+
+    def test_replace_swaps_the_ledger(self):
+        filename = self.write("rows.json", json.dumps({"meta": "transactions", "transactions": [row(5), row(6)]}))
+        Finance_Tracker.storage.add(row(1))
+        self.assertEqual(import_transactions(filename, "replace", batch_size=1), (2, 0, []))
+        Finance_Tracker.storage.add(row(7))
+        self.assertEqual(amounts(Finance_Tracker.transactions), [5.0, 6.0, 7.0])
+        self.reopen_ledger()
+        self.assertEqual(amounts(Finance_Tracker.transactions), [5.0, 6.0, 7.0])
+
+    def test_failed_replace_keeps_the_ledger(self):
+        Finance_Tracker.storage.add(row(1))
+        filename = self.write("rows.json", '{"transactions": [' + json.dumps(row(5)) + ", {broken")
+        with self.assertRaises(ValueError):
+            import_transactions(filename, "replace", batch_size=1)
+        self.assertEqual(amounts(Finance_Tracker.transactions), [1.0])
+        self.reopen_ledger()
+        self.assertEqual(amounts(Finance_Tracker.transactions), [1.0])
+
+    def test_open_ledger_cannot_be_imported(self):
+        Finance_Tracker.storage.add(row(1))
+        Finance_Tracker.storage.save()
+        for filename in (Finance_Tracker.storage.path, Finance_Tracker.storage.journal_path):
+            with self.assertRaises(ValueError):
+                import_transactions(filename, "replace")
+        self.assertEqual(amounts(Finance_Tracker.transactions), [1.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
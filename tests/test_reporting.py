@@ -0,0 +1,64 @@
+import os
+import random
+import sys
+import unittest
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from reporting import build_report
+from transaction_store import TransactionStore
+
+CATEGORIES = ["Food", "Rent", "Salary", "Fuel"]
+
+
+def random_rows(count, seed=11):
+    rng = random.Random(seed)
+    return [{"amount": round(rng.uniform(0, 200), 2), "category": rng.choice(CATEGORIES),
+             "type": rng.choice(["Income", "Expense"]),
+             "date": f"{rng.randint(2023, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+            for _ in range(count)]
+
+
+def rounded(totals):
+    return [(group, round(income, 6), round(expenses, 6)) for group, income, expenses in totals]
+
+
+class BuildReportTests(unittest.TestCase):
+    def test_worker_counts_agree_with_a_plain_sum(self):
+        rows = random_rows(3000)
+        store = TransactionStore(rows)
+        for date_range in ("", "2023-03..2023-08"):
+            selected = [row for row in rows if not date_range or "2023-03-01" <= row["date"] <= "2023-08-31"]
+            months = defaultdict(lambda: [0.0, 0.0])
+            for row in selected:
+                months[row["date"][:7]][row["type"] == "Expense"] += row["amount"]
+            expected = [(month, income, expenses) for month, (income, expenses) in sorted(months.items())]
+
+            reports = [build_report(store, date_range, workers=1)]
+            reports += [build_report(store, date_range, workers=workers, parallel=True) for workers in (1, 2, 3)]
+            for report in reports:
+                self.assertEqual(rounded(report.month_totals()), rounded(expected))
+                self.assertEqual(report.totals[2], len(selected))
+                self.assertEqual(rounded(report.category_totals()), rounded(reports[0].category_totals()))
+
+    def test_rolling_totals_cover_empty_months(self):
+        store = TransactionStore([
+            {"amount": 10.0, "category": "Pay", "type": "Income", "date": "2024-01-15"},
+            {"amount": 4.0, "category": "Food", "type": "Expense", "date": "2024-01-20"},
+            {"amount": 6.0, "category": "Pay", "type": "Income", "date": "2024-04-02"},
+        ])
+        report = build_report(store, window=2, workers=1)
+        self.assertEqual(report.rolling_totals(), [("2024-01", 10.0, 4.0), ("2024-02", 10.0, 4.0),
+                                                   ("2024-03", 0.0, 0.0), ("2024-04", 6.0, 0.0)])
+
+    def test_bad_arguments(self):
+        store = TransactionStore(random_rows(10))
+        with self.assertRaises(ValueError):
+            build_report(store, "not a date")
+        with self.assertRaises(ValueError):
+            build_report(store, window=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
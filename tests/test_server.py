@@ -0,0 +1,107 @@
+import asyncio
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from server import LedgerServer, RemoteStorage
+from storage import JsonStorage
+
+
+def row(amount, category="Food", type_="Expense", date="2024-01-05"):
+    return {"amount": float(amount), "category": category, "type": type_, "date": date}
+
+
+def free_address(directory):
+    if hasattr(socket, "AF_UNIX"):
+        return os.path.join(directory, "ledger.sock")
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return f"127.0.0.1:{port}"
+
+
+class LedgerServerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.ledger_path = os.path.join(self.directory, "transactions.json")
+        self.address = free_address(self.directory)
+        self.server = LedgerServer({"default": self.ledger_path,
+                                    "savings": os.path.join(self.directory, "savings.json")})
+        self.server.open()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=asyncio.run, args=(self.server.serve(self.address, ready),))
+        self.thread.start()
+        self.assertTrue(ready.wait(5))
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.stop()
+        shutil.rmtree(self.directory)
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.server.shutdown()
+            self.thread.join(5)
+        self.server.close()
+
+    def connect(self, ledger="default"):
+        client = RemoteStorage(self.address, ledger)
+        client.load()
+        self.clients.append(client)
+        return client
+
+    def test_clients_share_one_ledger(self):
+        first, second = self.connect(), self.connect()
+        first.add(row(5))
+        second.extend_columns({"amount": [1.0, 9.0], "category": ["Pay", "Food"], "type": ["Income", "Expense"],
+                               "date": ["2024-02-01", "2024-03-01"]})
+        with first.batch() as batch:
+            batch.update(0, row(6))
+            batch.delete(2)
+        self.assertEqual([r["amount"] for r in second.transactions], [6.0, 1.0])
+        self.assertEqual([r["amount"] for r in second.transactions.search("category", "pay")], [1.0])
+        self.assertEqual([r["amount"] for r in second.transactions.sorted_view("amount")], [1.0, 6.0])
+        summary = second.transactions.ensure_aggregates()
+        self.assertEqual((summary.income, summary.expenses), (1.0, 6.0))
+        self.assertEqual(len(self.connect("savings").transactions), 0)
+
+    def test_errors_reach_the_client(self):
+        client = self.connect()
+        client.add(row(1))
+        with self.assertRaises(IndexError):
+            client.delete(5)
+        with self.assertRaises(ValueError):
+            client.add(row(1, type_="Expens"))
+        with self.assertRaises(ValueError):
+            self.connect("missing")
+        self.assertEqual(len(client.transactions), 1)
+
+    def test_served_file_cannot_be_opened_directly(self):
+        self.connect().add(row(1))
+        with self.assertRaises(TimeoutError):
+            JsonStorage(self.ledger_path).load()
+
+    def test_edits_are_on_disk_after_shutdown(self):
+        client = self.connect()
+        client.extend([row(1), row(2)])
+        client.replace_columns([{"amount": [7.0], "category": ["Gift"], "type": ["Income"], "date": ["2024-05-01"]}])
+        client.add(row(8))
+        self.stop()
+
+        ledger = JsonStorage(self.ledger_path)
+        ledger.load()
+        self.assertEqual([r["amount"] for r in ledger.transactions], [7.0, 8.0])
+        ledger.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
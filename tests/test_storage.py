@@ -0,0 +1,342 @@
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import storage
+from storage import BinaryStorage, JsonStorage, PartitionedStorage, SqliteStorage
+from transaction_store import FIELDS, TransactionStore
+
+
+def row(amount, date="2024-01-05"):
+    return {"amount": float(amount), "category": "Food", "type": "Expense", "date": date}
+
+
+def wait_for_compaction(ledger):
+    while ledger.compacting:
+        time.sleep(0.01)
+    ledger.flush()
+
+
+class SlowCompaction:
+    # Makes the background compaction's snapshot write slow, so a save can
+    # start while it is in flight.
+    def write_snapshot(self, rows, seq):
+        if threading.current_thread() is not threading.main_thread():
+            self.compaction_started.set()
+            time.sleep(0.2)
+        super().write_snapshot(rows, seq)
+
+
+class SlowJsonStorage(SlowCompaction, JsonStorage):
+    compaction_started = None
+
+
+class SlowPartitionedStorage(PartitionedStorage):
+    # Pauses the background compaction between writing the new partition
+    # files and updating the in-memory entries.
+    compaction_started = None
+
+    def write_partitions(self, snapshot, seq):
+        written = super().write_partitions(snapshot, seq)
+        if threading.current_thread() is not threading.main_thread():
+            self.compaction_started.set()
+            time.sleep(0.2)
+        return written
+
+
+class StorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.threshold = storage.COMPACT_THRESHOLD
+        storage.COMPACT_THRESHOLD = 10
+
+    def tearDown(self):
+        storage.COMPACT_THRESHOLD = self.threshold
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+class LegacySnapshotTests(StorageTestCase):
+    def test_invalid_rows_are_set_aside(self):
+        rows = [row(5), {"amount": 7, "category": "Fuel", "type": "Expens", "date": "2024-1-5"},
+                {"amount": 9, "category": "Pay", "type": "income", "date": "2024-01-09"}]
+        with open(self.path("transactions.json"), "w") as file:
+            json.dump({"transactions": rows}, file)
+        ledger = JsonStorage(self.path("transactions.json"))
+        ledger.load()
+        self.assertEqual([r["amount"] for r in ledger.transactions], [5.0, 9.0])
+        self.assertEqual(ledger.transactions[1]["type"], "Income")
+        self.assertEqual([number for number, _ in ledger.rejected], [2])
+        with open(ledger.rejected_path) as file:
+            self.assertEqual(json.load(file)["transactions"], [rows[1]])
+
+
+class SnapshotRaceTests(StorageTestCase):
+    def test_save_during_compaction_keeps_newer_snapshot(self):
+        ledger = SlowJsonStorage(self.path("transactions.json"))
+        ledger.compaction_started = threading.Event()
+        ledger.load()
+        for amount in range(storage.COMPACT_THRESHOLD):
+            ledger.add(row(amount))
+        self.assertTrue(ledger.compaction_started.wait(5))
+        for amount in range(5):
+            ledger.add(row(100 + amount))
+        ledger.save()
+        wait_for_compaction(ledger)
+        ledger.close()
+
+        reloaded = JsonStorage(self.path("transactions.json"))
+        reloaded.load()
+        self.assertEqual(len(reloaded.transactions), storage.COMPACT_THRESHOLD + 5)
+
+    def test_edits_do_not_wait_for_the_snapshot_write(self):
+        for shared in (False, True):
+            path = self.path(f"transactions-{shared}.json")
+            ledger = SlowJsonStorage(path, shared=shared)
+            ledger.compaction_started = threading.Event()
+            ledger.load()
+            for amount in range(storage.COMPACT_THRESHOLD):
+                ledger.add(row(amount))
+            self.assertTrue(ledger.compaction_started.wait(5))
+            started = time.perf_counter()
+            ledger.add(row(100))
+            self.assertLess(time.perf_counter() - started, 0.1)
+            self.assertTrue(ledger.compacting)
+            wait_for_compaction(ledger)
+            ledger.close()
+
+            reloaded = JsonStorage(path)
+            reloaded.load()
+            self.assertEqual(len(reloaded.transactions), storage.COMPACT_THRESHOLD + 1)
+            reloaded.close()
+
+    def test_save_during_partition_compaction_keeps_files(self):
+        ledger = SlowPartitionedStorage(self.path("ledger"), migrate_from=None)
+        ledger.compaction_started = threading.Event()
+        ledger.load()
+        for amount in range(storage.COMPACT_THRESHOLD):
+            ledger.add(row(amount))
+        self.assertTrue(ledger.compaction_started.wait(5))
+        for amount in range(5):
+            ledger.add(row(100 + amount, "2024-02-10"))
+        ledger.update(0, row(50))
+        ledger.save()
+        wait_for_compaction(ledger)
+        ledger.close()
+
+        reloaded = PartitionedStorage(self.path("ledger"), migrate_from=None)
+        reloaded.load()
+        self.assertEqual([r["amount"] for r in reloaded.transactions],
+                         [50.0] + [float(a) for a in range(1, storage.COMPACT_THRESHOLD)]
+                         + [float(100 + a) for a in range(5)])
+
+    def test_reload_after_many_compactions(self):
+        for open_ledger in (lambda: JsonStorage(self.path("transactions.json")),
+                            lambda: BinaryStorage(self.path("transactions.snap"), migrate_from=None),
+                            lambda: PartitionedStorage(self.path("ledger"), migrate_from=None)):
+            ledger = open_ledger()
+            ledger.load()
+            for amount in range(95):
+                ledger.add(row(amount))
+                if amount % 30 == 0:
+                    ledger.save()
+            wait_for_compaction(ledger)
+            ledger.close()
+            reloaded = open_ledger()
+            reloaded.load()
+            self.assertEqual([r["amount"] for r in reloaded.transactions], [float(a) for a in range(95)])
+
+
+class BatchTests(StorageTestCase):
+    def ledgers(self):
+        return (lambda: JsonStorage(self.path("transactions.json")),
+                lambda: BinaryStorage(self.path("transactions.snap"), migrate_from=None),
+                lambda: SqliteStorage(self.path("transactions.db"), migrate_from=self.path("none.json")))
+
+    def test_invalid_batch_is_refused_whole(self):
+        for open_ledger in self.ledgers():
+            ledger = open_ledger()
+            ledger.load()
+            ledger.add(row(1))
+            with self.assertRaises(IndexError):
+                with ledger.batch() as batch:
+                    batch.add(row(2))
+                    batch.delete(0)
+                    batch.delete(1)
+            with self.assertRaises(ValueError):
+                ledger.apply_batch([{"op": "add", "transaction": row(3)},
+                                    {"op": "add", "transaction": dict(row(4), type="Expens")}])
+            self.assertEqual([r["amount"] for r in ledger.transactions], [1.0])
+            ledger.close()
+
+    def test_failure_while_applying_rolls_back(self):
+        original = storage.apply_operation
+
+        def failing(store, operation):
+            if operation["op"] == "delete":
+                raise OSError("simulated failure")
+            original(store, operation)
+
+        for open_ledger in self.ledgers():
+            ledger = open_ledger()
+            ledger.load()
+            ledger.add(row(1))
+            storage.apply_operation = failing
+            try:
+                with self.assertRaises(OSError):
+                    with ledger.batch() as batch:
+                        batch.add(row(2))
+                        batch.update(0, row(5))
+                        batch.delete(0)
+            finally:
+                storage.apply_operation = original
+            self.assertEqual([r["amount"] for r in ledger.transactions], [1.0])
+            ledger.add(row(6))
+            ledger.close()
+
+            reloaded = open_ledger()
+            reloaded.load()
+            self.assertEqual([r["amount"] for r in reloaded.transactions], [1.0, 6.0])
+            reloaded.close()
+
+
+def as_tuples(rows):
+    return sorted(tuple(r[field] for field in FIELDS) for r in rows)
+
+
+class SqliteTests(StorageTestCase):
+    def test_migrates_the_json_ledger_once(self):
+        with open(self.path("transactions.json"), "w") as file:
+            json.dump({"seq": 1, "transactions": [row(1), row(2, "2024-02-01")]}, file)
+        with open(self.path("transactions.journal"), "w") as file:
+            for record in ({"op": "add", "transaction": row(1), "seq": 1},
+                           {"op": "update", "index": 0, "transaction": row(3), "seq": 2}):
+                file.write(json.dumps(record) + "\n")
+
+        database = SqliteStorage(self.path("transactions.db"), migrate_from=self.path("transactions.json"))
+        database.load()
+        self.assertEqual([r["amount"] for r in database.transactions], [3.0, 2.0])
+        database.close()
+        # The JSON ledger is only read: no lock file is left next to it.
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) if name.startswith("transactions.j")),
+                         ["transactions.journal", "transactions.json"])
+
+        source = JsonStorage(self.path("transactions.json"))
+        source.load()
+        source.add(row(4))
+        source.close()
+        database = SqliteStorage(self.path("transactions.db"), migrate_from=source.path)
+        database.load()
+        self.assertEqual(len(database.transactions), 2)
+        database.close()
+
+    def test_queries_match_the_in_memory_store(self):
+        rng = random.Random(3)
+        rows = [{"amount": round(rng.uniform(0, 100), 2), "category": rng.choice(["Food", "food", "Rent", "Pay"]),
+                 "type": rng.choice(["Income", "Expense"]),
+                 "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"} for _ in range(300)]
+        database = SqliteStorage(self.path("transactions.db"), migrate_from=None)
+        database.load()
+        database.extend(rows)
+        memory = TransactionStore(rows)
+        for field, value in (("category", "FOOD"), ("type", "income"), ("date", "2024-03..2024-05"), ("date", "bad")):
+            self.assertEqual(as_tuples(database.transactions.search(field, value)),
+                             as_tuples(memory.search(field, value)), (field, value))
+        self.assertEqual([r["amount"] for r in database.transactions.sorted_view("amount", reverse=True)[:]],
+                         [r["amount"] for r in memory.sorted_view("amount", reverse=True)[:]])
+        expected = memory.ensure_aggregates()
+        summary = database.transactions.ensure_aggregates()
+        self.assertAlmostEqual(summary.income, expected.income)
+        self.assertAlmostEqual(summary.expenses, expected.expenses)
+        self.assertEqual(set(summary.category_totals()), set(expected.category_totals()))
+        database.close()
+
+    def test_connections_see_each_others_commits(self):
+        first = SqliteStorage(self.path("transactions.db"), migrate_from=None)
+        second = SqliteStorage(self.path("transactions.db"), migrate_from=None)
+        first.load()
+        second.load()
+        first.add(row(1))
+        second.add(row(2))
+        first.refresh()
+        self.assertEqual([r["amount"] for r in first.transactions], [1.0, 2.0])
+        first.close()
+        second.close()
+
+
+class ReplaceTests(StorageTestCase):
+    def test_replace_swaps_in_a_new_snapshot(self):
+        columns = {"amount": [5.0, 6.0], "category": ["Pay", "Pay"], "type": ["Income", "Income"],
+                   "date": ["2024-03-01", "2024-03-02"]}
+        for open_ledger in (lambda: JsonStorage(self.path("transactions.json")),
+                            lambda: BinaryStorage(self.path("transactions.snap"), migrate_from=None),
+                            lambda: PartitionedStorage(self.path("ledger"), migrate_from=None)):
+            ledger = open_ledger()
+            ledger.load()
+            ledger.add(row(1))
+            ledger.replace_columns(iter([columns]))
+            ledger.add(row(7, "2024-04-01"))
+            self.assertEqual([r["amount"] for r in ledger.transactions], [5.0, 6.0, 7.0])
+            ledger.close()
+
+            reloaded = open_ledger()
+            reloaded.load()
+            self.assertEqual([r["amount"] for r in reloaded.transactions], [5.0, 6.0, 7.0])
+            reloaded.close()
+
+class LedgerLockTests(StorageTestCase):
+    def test_shared_ledgers_see_each_others_edits(self):
+        for open_ledger in (lambda: JsonStorage(self.path("transactions.json"), shared=True),
+                            lambda: BinaryStorage(self.path("transactions.snap"), migrate_from=None, shared=True)):
+            ledgers = [open_ledger(), open_ledger()]
+            for ledger in ledgers:
+                ledger.load()
+            for amount in range(15):
+                ledgers[amount % 2].add(row(amount))
+            ledgers[0].refresh()
+            self.assertEqual([r["amount"] for r in ledgers[0].transactions], [float(a) for a in range(15)])
+            for ledger in ledgers:
+                wait_for_compaction(ledger)
+                ledger.close()
+
+    def test_second_open_is_refused(self):
+        for open_ledger in (lambda: JsonStorage(self.path("transactions.json")),
+                            lambda: PartitionedStorage(self.path("ledger"), migrate_from=None)):
+            ledger = open_ledger()
+            ledger.load()
+            with self.assertRaises(TimeoutError):
+                open_ledger().load()
+            ledger.close()
+            reopened = open_ledger()
+            reopened.load()
+            reopened.close()
+
+    def test_refresh_gives_up_on_a_busy_ledger(self):
+        reader = JsonStorage(self.path("transactions.json"), shared=True)
+        writer = JsonStorage(self.path("transactions.json"), shared=True)
+        reader.load()
+        writer.load()
+        writer.add(row(1))
+        with storage.FileLock(writer.lock_path()):
+            started = time.perf_counter()
+            with self.assertRaises(TimeoutError):
+                reader.refresh(timeout=0)
+            self.assertLess(time.perf_counter() - started, 1)
+        reader.refresh(timeout=0)
+        self.assertEqual(len(reader.transactions), 1)
+        reader.close()
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
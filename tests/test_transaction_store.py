@@ -0,0 +1,150 @@
+import os
+import random
+import sys
+import unittest
+from operator import itemgetter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transaction_store import FIELDS, TransactionAggregates, TransactionStore
+
+CATEGORIES = ["Food", "Rent", "Salary", "Fuel", "Gifts", "Travel"]
+STEPS = 3000
+
+
+def random_row(rng):
+    return {
+        "amount": round(rng.uniform(0, 500), 2),
+        "category": rng.choice(CATEGORIES),
+        "type": rng.choice(["Income", "Expense"]),
+        "date": f"{rng.randint(2022, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+    }
+
+
+def random_edits(store, reference, rng, steps=STEPS):
+    # Applies the same random adds, bulk appends, updates and deletes to the
+    # store and to a list of dicts, yielding after each step.
+    for _ in range(steps):
+        choice = rng.random()
+        if choice < 0.05:
+            rows = [random_row(rng) for _ in range(rng.randrange(20))]
+            store.extend_columns({field: [row[field] for row in rows] for field in FIELDS})
+            reference.extend(rows)
+        elif choice < 0.5 or not reference:
+            row = random_row(rng)
+            store.append(row)
+            reference.append(row)
+        elif choice < 0.8:
+            index = rng.randrange(len(reference))
+            row = random_row(rng)
+            store[index] = row
+            reference[index] = row
+        else:
+            index = rng.randrange(len(reference))
+            del store[index]
+            del reference[index]
+        yield
+
+
+class AggregateTests(unittest.TestCase):
+    def check(self, store, reference):
+        running = store.ensure_aggregates()
+        recomputed = TransactionAggregates(store)
+        self.assertTrue(running.matches(recomputed))
+        income = sum(row["amount"] for row in reference if row["type"] == "Income")
+        expenses = sum(row["amount"] for row in reference if row["type"] == "Expense")
+        self.assertAlmostEqual(running.income, income, places=6)
+        self.assertAlmostEqual(running.expenses, expenses, places=6)
+        self.assertEqual(sum(totals[2] for totals in running.by_category.values()), len(reference))
+
+    def test_random_edits_match_full_recompute(self):
+        for seed in range(5):
+            rng = random.Random(seed)
+            store = TransactionStore()
+            reference = []
+            store.ensure_aggregates()
+            for step, _ in enumerate(random_edits(store, reference, rng)):
+                if step % 100 == 0:
+                    self.check(store, reference)
+            self.check(store, reference)
+
+    def test_category_and_month_totals(self):
+        rng = random.Random(42)
+        store = TransactionStore()
+        reference = []
+        store.ensure_aggregates()
+        for _ in random_edits(store, reference, rng):
+            pass
+        categories = {}
+        months = {}
+        for row in reference:
+            for table, key in ((categories, row["category"]), (months, row["date"][:7])):
+                income, expenses = table.get(key, (0.0, 0.0))
+                if row["type"] == "Income":
+                    income += row["amount"]
+                else:
+                    expenses += row["amount"]
+                table[key] = (income, expenses)
+        for actual, expected in ((store.ensure_aggregates().category_totals(), categories),
+                                 (store.ensure_aggregates().month_totals(), months)):
+            self.assertEqual([name for name, _, _ in actual], sorted(expected))
+            for name, income, expenses in actual:
+                self.assertAlmostEqual(income, expected[name][0], places=6)
+                self.assertAlmostEqual(expenses, expected[name][1], places=6)
+
+    def test_clear_drops_aggregates(self):
+        store = TransactionStore([random_row(random.Random(1)) for _ in range(10)])
+        store.ensure_aggregates()
+        store.clear()
+        self.assertEqual(store.ensure_aggregates().totals, [0.0, 0.0, 0])
+
+
+class IndexTests(unittest.TestCase):
+    def test_search_and_sort_follow_edits(self):
+        rng = random.Random(7)
+        store = TransactionStore()
+        reference = []
+        store.ensure_index()
+        store.sorted_view("amount")[:1]
+        for step, _ in enumerate(random_edits(store, reference, rng, 1500)):
+            if step % 150:
+                continue
+            self.assertEqual([dict(row) for row in store], reference)
+            found = [dict(row) for row in store.search("category", "food")]
+            self.assertEqual(found, [row for row in reference if row["category"] == "Food"])
+            found = [dict(row) for row in store.search("date", "2023-03")]
+            self.assertEqual(sorted(found, key=lambda row: row["date"]),
+                             sorted((row for row in reference if row["date"].startswith("2023-03")),
+                                    key=lambda row: row["date"]))
+            amounts = [row["amount"] for row in store.sorted_view("amount")[:]]
+            self.assertEqual(amounts, sorted(row["amount"] for row in reference))
+
+    def test_updates_keep_sort_orders(self):
+        rng = random.Random(5)
+        reference = [random_row(rng) for _ in range(300)]
+        store = TransactionStore(reference)
+        keys = {"amount": itemgetter("amount"), "date": itemgetter("date"),
+                "category": lambda row: row["category"].lower()}
+        for field in keys:
+            store.sort_order(field)
+        for step in range(300):
+            index = rng.randrange(len(reference))
+            store[index] = reference[index] = random_row(rng)
+            if step % 50 == 0:
+                for field, key in keys.items():
+                    self.assertEqual(sorted(store.sort_order(field)), list(range(len(reference))))
+                    self.assertEqual([key(row) for row in store.sorted_view(field)[:]], sorted(map(key, reference)))
+
+    def test_sorted_view_stops_at_its_ends(self):
+        store = TransactionStore({"amount": amount, "category": "Food", "type": "Expense", "date": "2024-01-05"}
+                                 for amount in (3.0, 1.0, 2.0))
+        for reverse, expected in ((False, [1.0, 2.0, 3.0]), (True, [3.0, 2.0, 1.0])):
+            view = store.sorted_view("amount", reverse)
+            self.assertEqual([row["amount"] for row in view], expected)
+            for index in (3, -4):
+                with self.assertRaises(IndexError):
+                    view[index]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transaction_store import FIELDS
+from validation import AMOUNT_CHUNK_SIZE, normalize_transaction, parse_category, validate_columns, validate_rows
+
+RAW_VALUES = {
+    "amount": ["1.50", " 20 ", "3.", "-2", "1e3", "abc", "", None, 7, 2.25, -1, float("nan"), True],
+    "category": ["Food", " Rent ", "", None, 5],
+    "type": ["Income", "expense", " INCOME ", "Expens", "", None, 1],
+    "date": ["2024-01-05", " 2024-12-31 ", "2024-02-30", "2024-1-5", "", None, 20240105],
+}
+
+
+class ValidateColumnsTests(unittest.TestCase):
+    def test_reports_every_problem_of_each_bad_row(self):
+        columns, errors = validate_columns(
+            ["1.50", "-2", 3, None, "4", "5"],
+            [" Food ", "Fuel", None, "Pay", 7, "Gift"],
+            ["expense", "Expense", "INCOME", "Income", "Expens", "Income"],
+            ["2024-01-05", "2024-01-06", "2024-01-07", "2024-02-30", "2024-01-09", "2024-1-9"])
+        self.assertEqual(errors, [(1, "invalid amount '-2'"),
+                                  (3, "missing amount, invalid date '2024-02-30'"),
+                                  (4, "invalid type 'Expens'"),
+                                  (5, "invalid date '2024-1-9'")])
+        self.assertEqual(list(columns["amount"]), [1.5, 3.0])
+        self.assertEqual(columns["category"], ["Food", ""])
+        self.assertEqual(columns["type"], ["Expense", "Income"])
+        self.assertEqual(columns["date"], ["2024-01-05", "2024-01-07"])
+
+    def test_rows_that_are_not_objects(self):
+        transactions, errors = validate_rows([{"amount": 1, "category": "A", "type": "Income", "date": "2024-01-05"},
+                                              [1, 2], "text"])
+        self.assertEqual(len(transactions), 1)
+        self.assertEqual(errors, [(1, "row is not an object"), (2, "row is not an object")])
+
+    def test_agrees_with_normalize_transaction(self):
+        # More rows than one amount chunk, so clean and dirty chunks mix.
+        rng = random.Random(7)
+        for dirty in (0, 0.01, 0.3):
+            rows = []
+            for _ in range(AMOUNT_CHUNK_SIZE * 2 + 10):
+                rows.append({field: rng.choice(RAW_VALUES[field][:2] if rng.random() >= dirty else RAW_VALUES[field])
+                             for field in FIELDS})
+            expected, expected_errors = [], []
+            for position, row in enumerate(rows):
+                try:
+                    expected.append(normalize_transaction(row))
+                except ValueError:
+                    expected_errors.append(position)
+            transactions, errors = validate_rows(rows)
+            self.assertEqual(transactions, expected)
+            self.assertEqual([position for position, _ in errors], expected_errors)
+
+
+class ParseCategoryTests(unittest.TestCase):
+    def test_blank_categories_are_rejected(self):
+        self.assertEqual(parse_category(" Rent "), "Rent")
+        for value in ("", "   ", None):
+            with self.assertRaises(ValueError):
+                parse_category(value)
+
+
+if __name__ == "__main__":
+    unittest.main()
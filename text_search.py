@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+# Score tiers; a match scores its tier plus its trigram similarity (0..1),
+# so every exact match outranks every prefix match and so on.
+EXACT, PREFIX, SUBSTRING, FUZZY = 3, 2, 1, 0
+# Lowest trigram similarity accepted as a typo-tolerant match.
+FUZZY_THRESHOLD = 0.3
+
+
+def trigrams(text):
+    # Padded like pg_trgm, so short words and word starts still get grams.
+    padded = f"  {text} "
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def score_text(query, text, query_grams=None, shared=None):
+    # Scores one lower-cased text against a lower-cased query; None means no match.
+    if not query:
+        return EXACT
+    if text == query:
+        return EXACT + 1.0
+    query_grams = query_grams if query_grams is not None else trigrams(query)
+    text_grams = trigrams(text)
+    if shared is None:
+        shared = len(query_grams & text_grams)
+    similarity = shared / (len(query_grams) + len(text_grams) - shared)
+    if text.startswith(query):
+        return PREFIX + similarity
+    if query in text:
+        return SUBSTRING + similarity
+    if similarity >= FUZZY_THRESHOLD:
+        return FUZZY + similarity
+    return None
+
+
+class TrigramIndex:
+    # Inverted index from trigram to the keys whose text contains it. Keys are
+    # whatever the caller uses to find rows again, e.g. category codes.
+    def __init__(self, texts=()):
+        self.texts = {}
+        self.postings = defaultdict(set)
+        for key, text in texts:
+            self.add(key, text)
+
+    def add(self, key, text):
+        if key in self.texts:
+            self.remove(key)
+        text = text.lower()
+        self.texts[key] = text
+        for gram in trigrams(text):
+            self.postings[gram].add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key)
+        for gram in trigrams(text):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def match(self, query):
+        # Returns {key: score} for every key that matches query.
+        query = query.strip().lower()
+        if not query:
+            return {key: EXACT for key in self.texts}
+        query_grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for key in self.postings.get(gram, ()):
+                shared[key] += 1
+        if len(query) < 3:
+            # Too short to have an inner trigram, so a substring in the middle
+            # of a word shares none; check every text directly.
+            candidates = {key: shared.get(key, 0) for key in self.texts}
+        else:
+            candidates = shared
+        scores = {}
+        for key, count in candidates.items():
+            score = score_text(query, self.texts[key], query_grams, count)
+            if score is not None:
+                scores[key] = score
+        return scores
+
+
+def parse_amount_range(value):
+    # Accepts an amount or a range such as 10..50, 10.. or ..50. Returns
+    # (low, high) with None for an open end, or None when the text is invalid.
+    value = value.strip()
+    start, separator, end = value.partition("..")
+    try:
+        low = float(start) if start.strip() else None
+        high = float(end) if end.strip() else None
+    except ValueError:
+        return None
+    if not separator:
+        high = low
+    return low, high
@@ -0,0 +1,663 @@
+import calendar
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import date as Date
+from functools import lru_cache
+from itertools import compress
+
+from instrumentation import count, timed
+from text_search import TrigramIndex, parse_amount_range
+
+FIELDS = ("amount", "category", "type", "date")
+TYPES = ("Expense", "Income")
+REBUILD_AFTER_DELETES = 256
+
+# Each stored byte of the type bitmap expands to eight 0/1 bytes, one per row.
+_BIT_EXPAND = [bytes((value >> bit) & 1 for bit in range(8)) for value in range(256)]
+
+
+def copy_column(typecode, values):
+    # Copies an array or a memoryview of the same item type into a new array.
+    column = array(typecode)
+    column.frombytes(memoryview(values).cast("B"))
+    return column
+
+
+@lru_cache(maxsize=65536)
+def date_to_ordinal(text):
+    return Date.fromisoformat(text).toordinal()
+
+
+@lru_cache(maxsize=65536)
+def ordinal_to_date(ordinal):
+    return Date.fromordinal(ordinal).isoformat()
+
+
+def _date_bounds(text):
+    parts = text.strip().split("-")
+    if len(parts) == 1:
+        year = int(parts[0])
+        return Date(year, 1, 1).toordinal(), Date(year, 12, 31).toordinal()
+    if len(parts) == 2:
+        year, month = int(parts[0]), int(parts[1])
+        last_day = calendar.monthrange(year, month)[1]
+        return Date(year, month, 1).toordinal(), Date(year, month, last_day).toordinal()
+    ordinal = date_to_ordinal(text.strip())
+    return ordinal, ordinal
+
+
+def parse_date_query(value):
+    # Accepts YYYY, YYYY-MM or YYYY-MM-DD, or a range of those such as 2024-01..2024-03.
+    start, _, end = value.partition("..")
+    try:
+        first, _ = _date_bounds(start)
+        _, last = _date_bounds(end if end else start)
+    except ValueError:
+        return None
+    return first, last
+
+
+def parse_text_filters(amount_range="", date_range=""):
+    # Parses the optional filters of a text search into ((low, high), date
+    # bounds or None), raising ValueError for text that is not a valid filter.
+    amounts = parse_amount_range(amount_range)
+    if amounts is None:
+        raise ValueError(f"Invalid amount range {amount_range!r}")
+    if not date_range.strip():
+        return amounts, None
+    dates = parse_date_query(date_range)
+    if dates is None:
+        raise ValueError(f"Invalid date range {date_range!r}")
+    return amounts, dates
+
+
+class TransactionIndex:
+    # Row positions shift on every delete, so the index stores stable slot
+    # numbers instead and translates them back through the sorted list of
+    # slots deleted since the last rebuild.
+    def __init__(self, store):
+        self.store = store
+        self.by_category = {}
+        self.lower_codes = {}
+        self.by_date = {}
+        self.date_keys = []
+        self.deleted = []
+        self.next_slot = 0
+        for code, ordinal in zip(store.categories, store.dates):
+            self.add(code, ordinal)
+
+    def slot_of(self, position):
+        slot = position
+        while True:
+            skipped = bisect_right(self.deleted, slot)
+            if position + skipped == slot:
+                return slot
+            slot = position + skipped
+
+    def positions(self, slots):
+        deleted = self.deleted
+        if not deleted:
+            return list(slots)
+        return [slot - bisect_left(deleted, slot) for slot in slots]
+
+    def _insert(self, table, key, slot):
+        slots = table.get(key)
+        if slots is None:
+            slots = table[key] = array("q")
+            if table is self.by_date:
+                insort(self.date_keys, key)
+            else:
+                self.lower_codes.setdefault(self.store.category_names[key].lower(), set()).add(key)
+        if not slots or slots[-1] < slot:
+            slots.append(slot)
+        else:
+            insort(slots, slot)
+
+    def _remove(self, table, key, slot):
+        slots = table[key]
+        del slots[bisect_left(slots, slot)]
+        if not slots and table is self.by_date:
+            del table[key]
+            del self.date_keys[bisect_left(self.date_keys, key)]
+
+    def add(self, code, ordinal):
+        slot = self.next_slot
+        self.next_slot += 1
+        self._insert(self.by_category, code, slot)
+        self._insert(self.by_date, ordinal, slot)
+
+    def update(self, position, old_code, old_ordinal, code, ordinal):
+        slot = self.slot_of(position)
+        if code != old_code:
+            self._remove(self.by_category, old_code, slot)
+            self._insert(self.by_category, code, slot)
+        if ordinal != old_ordinal:
+            self._remove(self.by_date, old_ordinal, slot)
+            self._insert(self.by_date, ordinal, slot)
+
+    def delete(self, position, code, ordinal):
+        slot = self.slot_of(position)
+        self._remove(self.by_category, code, slot)
+        self._remove(self.by_date, ordinal, slot)
+        insort(self.deleted, slot)
+
+    def category(self, value):
+        codes = self.lower_codes.get(value.lower(), ())
+        lists = [self.by_category[code] for code in codes]
+        if len(lists) == 1:
+            return self.positions(lists[0])
+        return self.positions(heapq.merge(*lists))
+
+    def date_range(self, first, last):
+        start = bisect_left(self.date_keys, first)
+        stop = bisect_right(self.date_keys, last)
+        slots = []
+        for ordinal in self.date_keys[start:stop]:
+            slots.extend(self.by_date[ordinal])
+        return self.positions(slots)
+
+    def date_count(self, first, last):
+        start = bisect_left(self.date_keys, first)
+        stop = bisect_right(self.date_keys, last)
+        return sum(len(self.by_date[ordinal]) for ordinal in self.date_keys[start:stop])
+
+    def category_count(self, codes):
+        return sum(len(self.by_category.get(code, ())) for code in codes)
+
+
+@lru_cache(maxsize=65536)
+def month_of(ordinal):
+    return ordinal_to_date(ordinal)[:7]
+
+
+class TransactionAggregates:
+    # Totals are indexed by the type bit: [expense, income, row count].
+    @timed("store.aggregate")
+    def __init__(self, store):
+        self.store = store
+        self.totals = [0.0, 0.0, 0]
+        self.by_category = {}
+        self.by_month = {}
+        for amount, code, ordinal, is_income in zip(store.amounts, store.categories, store.dates, store.income_mask()):
+            self.add(amount, code, ordinal, is_income)
+        count("store.aggregate", len(store))
+
+    @staticmethod
+    def _apply(totals, amount, is_income, sign):
+        totals[is_income] += sign * amount
+        totals[2] += sign
+
+    def _apply_keyed(self, table, key, amount, is_income, sign):
+        totals = table.get(key)
+        if totals is None:
+            totals = table[key] = [0.0, 0.0, 0]
+        self._apply(totals, amount, is_income, sign)
+        if not totals[2]:
+            del table[key]
+
+    def add(self, amount, code, ordinal, is_income, sign=1):
+        self._apply(self.totals, amount, is_income, sign)
+        self._apply_keyed(self.by_category, code, amount, is_income, sign)
+        self._apply_keyed(self.by_month, month_of(ordinal), amount, is_income, sign)
+
+    def remove(self, amount, code, ordinal, is_income):
+        self.add(amount, code, ordinal, is_income, -1)
+
+    @property
+    def income(self):
+        return self.totals[1]
+
+    @property
+    def expenses(self):
+        return self.totals[0]
+
+    @property
+    def net(self):
+        return self.totals[1] - self.totals[0]
+
+    def category_totals(self):
+        names = self.store.category_names
+        return sorted((names[code], income, expenses) for code, (expenses, income, _) in self.by_category.items())
+
+    def month_totals(self):
+        return sorted((month, income, expenses) for month, (expenses, income, _) in self.by_month.items())
+
+    def matches(self, other, tolerance=1e-6):
+        def close(a, b):
+            return a[2] == b[2] and abs(a[0] - b[0]) <= tolerance and abs(a[1] - b[1]) <= tolerance
+
+        return (close(self.totals, other.totals)
+                and self.by_category.keys() == other.by_category.keys()
+                and all(close(totals, other.by_category[key]) for key, totals in self.by_category.items())
+                and self.by_month.keys() == other.by_month.keys()
+                and all(close(totals, other.by_month[key]) for key, totals in self.by_month.items()))
+
+
+class TransactionRow(Mapping):
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.store.get_field(self.index, key)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class RowList:
+    def __init__(self, store, positions):
+        self.store = store
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.store[position] for position in self.positions[item]]
+        return self.store[self.positions[item]]
+
+
+class SortedView:
+    def __init__(self, store, field, reverse=False):
+        self.store = store
+        self.field = field
+        self.reverse = reverse
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, item):
+        order = self.store.sort_order(self.field)
+        last = len(order) - 1
+        if isinstance(item, slice):
+            picked = range(len(order))[item]
+            return [self.store[order[last - k] if self.reverse else order[k]] for k in picked]
+        if item < 0:
+            item += len(order)
+        if not 0 <= item < len(order):
+            raise IndexError("transaction index out of range")
+        return self.store[order[last - item] if self.reverse else order[item]]
+
+
+class TransactionStore:
+    def __init__(self, rows=()):
+        self.amounts = array("d")
+        self.categories = array("I")
+        self.dates = array("i")
+        self.types = bytearray()
+        self.category_names = []
+        self.category_codes = {}
+        self.index = None
+        self.aggregates = None
+        self.sort_orders = {}
+        self.text_index = None
+        self.mapped = False
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def __iter__(self):
+        for index in range(len(self.amounts)):
+            yield TransactionRow(self, index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [TransactionRow(self, position) for position in range(len(self.amounts))[index]]
+        return TransactionRow(self, self._check_index(index))
+
+    def __setitem__(self, index, transaction):
+        index = self._check_index(index)
+        self.materialize()
+        amount, code, is_income, ordinal = self._encode(transaction)
+        # Sort orders are ranked by (key, position); the row is found by
+        # bisection while it still has its old key.
+        ranks = {field: (lambda row, key=self.sort_key(field): (key(row), row)) for field in self.sort_orders}
+        stale = {field: bisect_left(order, ranks[field](index), key=ranks[field])
+                 for field, order in self.sort_orders.items()}
+        if self.index is not None:
+            self.index.update(index, self.categories[index], self.dates[index], code, ordinal)
+        if self.aggregates is not None:
+            self.aggregates.remove(*self._aggregate_key(index))
+            self.aggregates.add(amount, code, ordinal, is_income)
+        self.amounts[index] = amount
+        self.categories[index] = code
+        self.dates[index] = ordinal
+        self._set_type(index, is_income)
+        for field, order in self.sort_orders.items():
+            del order[stale[field]]
+            insort(order, index, key=ranks[field])
+
+    def __delitem__(self, index):
+        index = self._check_index(index)
+        self.materialize()
+        if self.index is not None:
+            self.index.delete(index, self.categories[index], self.dates[index])
+            if len(self.index.deleted) > REBUILD_AFTER_DELETES:
+                self.index = None
+        if self.aggregates is not None:
+            self.aggregates.remove(*self._aggregate_key(index))
+        self.sort_orders.clear()
+        del self.amounts[index]
+        del self.categories[index]
+        del self.dates[index]
+        self._delete_type(index)
+
+    def _check_index(self, index):
+        size = len(self.amounts)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("transaction index out of range")
+        return index
+
+    def _intern(self, category):
+        code = self.category_codes.get(category)
+        if code is None:
+            code = len(self.category_names)
+            self.category_names.append(category)
+            self.category_codes[category] = code
+            if self.text_index is not None:
+                self.text_index.add(code, category)
+        return code
+
+    def _encode(self, transaction):
+        type_ = transaction["type"]
+        if type_ not in TYPES:
+            raise ValueError(f"Type must be 'Income' or 'Expense', not {type_!r}")
+        return (
+            float(transaction["amount"]),
+            self._intern(transaction["category"]),
+            type_ == "Income",
+            date_to_ordinal(transaction["date"]),
+        )
+
+    def _aggregate_key(self, index):
+        return self.amounts[index], self.categories[index], self.dates[index], self._is_income(index)
+
+    def _is_income(self, index):
+        return (self.types[index >> 3] >> (index & 7)) & 1
+
+    def _set_type(self, index, is_income):
+        if is_income:
+            self.types[index >> 3] |= 1 << (index & 7)
+        else:
+            self.types[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def _delete_type(self, index):
+        # Shift every bit after the deleted row down by one.
+        start = index >> 3
+        offset = index & 7
+        tail = int.from_bytes(self.types[start:], "little")
+        tail = (tail & ((1 << offset) - 1)) | ((tail >> (offset + 1)) << offset)
+        remaining = (len(self.amounts) + 7) // 8 - start
+        self.types[start:] = tail.to_bytes(remaining, "little")
+
+    def get_field(self, index, key):
+        if key == "amount":
+            return self.amounts[index]
+        if key == "category":
+            return self.category_names[self.categories[index]]
+        if key == "type":
+            return TYPES[self._is_income(index)]
+        if key == "date":
+            return ordinal_to_date(self.dates[index])
+        raise KeyError(key)
+
+    def get_row(self, index):
+        index = self._check_index(index)
+        return {
+            "amount": self.amounts[index],
+            "category": self.category_names[self.categories[index]],
+            "type": TYPES[self._is_income(index)],
+            "date": ordinal_to_date(self.dates[index]),
+        }
+
+    def rows(self):
+        for index in range(len(self.amounts)):
+            yield self.get_row(index)
+
+    def append(self, transaction):
+        amount, code, is_income, ordinal = self._encode(transaction)
+        self.materialize()
+        index = len(self.amounts)
+        if index & 7 == 0:
+            self.types.append(0)
+        self.amounts.append(amount)
+        self.categories.append(code)
+        self.dates.append(ordinal)
+        if is_income:
+            self._set_type(index, True)
+        if self.index is not None:
+            self.index.add(code, ordinal)
+        if self.aggregates is not None:
+            self.aggregates.add(amount, code, ordinal, is_income)
+        for field, order in self.sort_orders.items():
+            insort(order, index, key=self.sort_key(field))
+
+    def extend(self, rows):
+        for transaction in rows:
+            self.append(transaction)
+
+    def extend_columns(self, columns):
+        # Appends whole columns of normalized values (see FIELDS) at once.
+        # Categories, dates and types are encoded once per distinct value and
+        # the type bits are packed through a single int.
+        size = len(columns["amount"])
+        if any(len(columns[field]) != size for field in FIELDS):
+            raise ValueError("Columns must all have the same length")
+        amounts = array("d", columns["amount"])
+        unknown = set(columns["type"]) - set(TYPES)
+        if unknown:
+            raise ValueError(f"Type must be 'Income' or 'Expense', not {unknown.pop()!r}")
+        ordinals = {date: date_to_ordinal(date) for date in set(columns["date"])}
+        dates = array("i", map(ordinals.__getitem__, columns["date"]))
+        self.materialize()
+        codes = {category: self._intern(category) for category in dict.fromkeys(columns["category"])}
+        categories = array("I", map(codes.__getitem__, columns["category"]))
+
+        start = len(self.amounts)
+        types = columns["type"]
+        head = min(-start & 7, size)
+        self.amounts.extend(amounts)
+        self.categories.extend(categories)
+        self.dates.extend(dates)
+        for offset in range(head):
+            self._set_type(start + offset, types[offset] == "Income")
+        if size > head:
+            bits = "".join(map({"Income": "1", "Expense": "0"}.__getitem__, reversed(types[head:])))
+            self.types.extend(int(bits, 2).to_bytes((size - head + 7) // 8, "little"))
+
+        if self.index is not None or self.aggregates is not None:
+            for index in range(start, start + size):
+                if self.index is not None:
+                    self.index.add(self.categories[index], self.dates[index])
+                if self.aggregates is not None:
+                    self.aggregates.add(*self._aggregate_key(index))
+        self.sort_orders.clear()
+
+    def clear(self):
+        self.amounts = array("d")
+        self.categories = array("I")
+        self.dates = array("i")
+        self.types = bytearray()
+        self.index = None
+        self.aggregates = None
+        self.sort_orders = {}
+        self.text_index = None
+        self.mapped = False
+
+    def use_buffers(self, amounts, categories, dates, types, category_names):
+        # Serves reads straight from read-only buffers such as the memoryviews
+        # of a mapped snapshot; the first change copies them into arrays.
+        self.clear()
+        self.amounts = amounts
+        self.categories = categories
+        self.dates = dates
+        self.types = types
+        self.category_names = list(category_names)
+        self.category_codes = {name: code for code, name in enumerate(self.category_names)}
+        self.mapped = True
+
+    def adopt(self, other):
+        # Takes over other's columns; other must not be used afterwards.
+        self.clear()
+        self.amounts = other.amounts
+        self.categories = other.categories
+        self.dates = other.dates
+        self.types = other.types
+        self.category_names = other.category_names
+        self.category_codes = other.category_codes
+        self.mapped = other.mapped
+
+    def materialize(self):
+        if self.mapped:
+            self.amounts = copy_column("d", self.amounts)
+            self.categories = copy_column("I", self.categories)
+            self.dates = copy_column("i", self.dates)
+            self.types = bytearray(self.types)
+            self.mapped = False
+
+    def copy(self):
+        other = TransactionStore()
+        other.amounts = copy_column("d", self.amounts)
+        other.categories = copy_column("I", self.categories)
+        other.dates = copy_column("i", self.dates)
+        other.types = bytearray(self.types)
+        other.category_names = list(self.category_names)
+        other.category_codes = dict(self.category_codes)
+        return other
+
+    def income_mask(self):
+        return b"".join(map(_BIT_EXPAND.__getitem__, self.types))[:len(self.amounts)]
+
+    def type_mask(self, type_):
+        mask = self.income_mask()
+        if type_ == "Expense":
+            mask = mask.translate(bytes([1, 0]) + bytes(254))
+        return mask
+
+    def ensure_index(self):
+        if self.index is None:
+            self.index = TransactionIndex(self)
+        return self.index
+
+    def ensure_aggregates(self):
+        if self.aggregates is None:
+            self.aggregates = TransactionAggregates(self)
+        return self.aggregates
+
+    def find(self, field, value):
+        value = value.strip().lower()
+        if field == "category":
+            return self.ensure_index().category(value)
+        if field == "type":
+            if value not in ("income", "expense"):
+                return []
+            return list(compress(range(len(self.amounts)), self.type_mask(value.capitalize())))
+        if field == "date":
+            bounds = parse_date_query(value)
+            if bounds is None:
+                return []
+            return self.ensure_index().date_range(*bounds)
+        raise ValueError(f"Unknown search field {field!r}")
+
+    @timed("store.search", rows=len)
+    def search(self, field, value):
+        return RowList(self, self.find(field, value))
+
+    def ensure_text_index(self):
+        if self.text_index is None:
+            self.text_index = TrigramIndex(enumerate(self.category_names))
+        return self.text_index
+
+    def _filter_positions(self, positions, amounts, dates):
+        if dates is not None:
+            first, last = dates
+            ordinals = self.dates
+            positions = [position for position in positions if first <= ordinals[position] <= last]
+        low, high = amounts
+        values = self.amounts
+        if low is not None and high is not None:
+            positions = [position for position in positions if low <= values[position] <= high]
+        elif low is not None:
+            positions = [position for position in positions if values[position] >= low]
+        elif high is not None:
+            positions = [position for position in positions if values[position] <= high]
+        return positions
+
+    def text_matches(self, text, amounts=(None, None), dates=None):
+        # Rows whose category matches text (substring, prefix or a close
+        # spelling) as [(score, positions)], best score first and positions in
+        # row order. The trigram index only holds the distinct category names;
+        # rows come from the category or date index, whichever has fewer
+        # candidates.
+        scores = self.ensure_text_index().match(text)
+        if not scores:
+            return []
+        index = self.ensure_index()
+        groups = defaultdict(list)
+        if dates is not None and index.date_count(*dates) < index.category_count(scores):
+            codes = self.categories
+            for position in self._filter_positions(index.date_range(*dates), amounts, None):
+                score = scores.get(codes[position])
+                if score is not None:
+                    groups[score].append(position)
+            return [(score, sorted(groups[score])) for score in sorted(groups, reverse=True)]
+
+        for code, score in scores.items():
+            groups[score].append(index.by_category.get(code, ()))
+        ranked = []
+        for score in sorted(groups, reverse=True):
+            slots = groups[score]
+            positions = index.positions(slots[0] if len(slots) == 1 else heapq.merge(*slots))
+            positions = self._filter_positions(positions, amounts, dates)
+            if positions:
+                ranked.append((score, positions))
+        return ranked
+
+    @timed("store.text_search", rows=len)
+    def text_search(self, text, amount_range="", date_range=""):
+        amounts, dates = parse_text_filters(amount_range, date_range)
+        ranked = self.text_matches(text, amounts, dates)
+        return RowList(self, ranked[0][1] if len(ranked) == 1 else [position for _, positions in ranked
+                                                                      for position in positions])
+
+    def sort_key(self, field):
+        if field == "amount":
+            return self.amounts.__getitem__
+        if field == "date":
+            return self.dates.__getitem__
+        if field == "category":
+            lowered = [name.lower() for name in self.category_names]
+            categories = self.categories
+            return lambda index: lowered[categories[index]]
+        raise ValueError(f"Unknown sort field {field!r}")
+
+    def sort_order(self, field):
+        # Ascending order only; descending is the same order walked backwards.
+        # sorted() is stable, so equal keys stay in row order.
+        order = self.sort_orders.get(field)
+        if order is None:
+            order = self.sort_orders[field] = self.build_sort_order(field)
+        return order
+
+    @timed("store.sort", rows=len)
+    def build_sort_order(self, field):
+        return array("q", sorted(range(len(self.amounts)), key=self.sort_key(field)))
+
+    def sorted_view(self, field="amount", reverse=False):
+        return SortedView(self, field, reverse)
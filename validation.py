@@ -0,0 +1,246 @@
+import re
+from array import array
+from itertools import chain, compress
+from operator import itemgetter
+
+from transaction_store import FIELDS, TYPES, date_to_ordinal, ordinal_to_date
+
+TYPE_NAMES = {"income": "Income", "expense": "Expense"}
+INFINITY = float("inf")
+# Stands in for every field of a row that is not an object, so the row can
+# travel through the columns and still be reported as a whole.
+NOT_AN_OBJECT = object()
+NOT_AN_OBJECT_ROW = dict.fromkeys(FIELDS, NOT_AN_OBJECT)
+
+AMOUNT_ERROR = "Invalid amount"
+TYPE_ERROR = "Type must be 'Income' or 'Expense'"
+DATE_ERROR = "Date must be a valid date in YYYY-MM-DD format"
+CATEGORY_ERROR = "Category cannot be empty"
+
+# Without signs, exponents or letters, float() accepts exactly the amounts
+# _amount does, so a column that passes this scan can be converted wholesale.
+AMOUNT_CHARACTERS = re.compile(r"[0-9. \t\n]*")
+AMOUNT_CHUNK_SIZE = 4096
+
+
+# The underscored parsers return None instead of raising so the batched path
+# can run them over whole columns without paying for exceptions.
+
+def _amount(value):
+    if type(value) is float or type(value) is int:
+        return float(value) if 0 <= value < INFINITY else None
+    if isinstance(value, str):
+        text = value.strip()
+        if text.replace(".", "", 1).isdecimal():
+            return float(text)
+    return None
+
+
+def _type(value):
+    if isinstance(value, str):
+        return TYPE_NAMES.get(value.strip().lower())
+    return None
+
+
+def _date(value):
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    if len(text) != 10 or text[4] != "-" or text[7] != "-" or not text.replace("-", "").isdecimal():
+        return None
+    try:
+        return date_to_ordinal(text)
+    except ValueError:
+        return None
+
+
+def _category(value):
+    if value is None:
+        return ""
+    return value.strip() if isinstance(value, str) else str(value).strip()
+
+
+def parse_amount(value):
+    amount = _amount(value)
+    if amount is None:
+        raise ValueError(AMOUNT_ERROR)
+    return amount
+
+
+def parse_type(value):
+    type_ = _type(value)
+    if type_ is None:
+        raise ValueError(TYPE_ERROR)
+    return type_
+
+
+def parse_date(value):
+    ordinal = _date(value)
+    if ordinal is None:
+        raise ValueError(DATE_ERROR)
+    return ordinal
+
+
+def parse_category(value):
+    # For re-categorizing, where a blank category would erase the existing ones.
+    category = _category(value)
+    if not category:
+        raise ValueError(CATEGORY_ERROR)
+    return category
+
+
+def normalize_transaction(row):
+    return {
+        "amount": parse_amount(row.get("amount")),
+        "category": _category(row.get("category")),
+        "type": parse_type(row.get("type")),
+        "date": ordinal_to_date(parse_date(row.get("date"))),
+    }
+
+
+def validate_transaction(transaction):
+    # Checks a row that is already normalized, right before it is stored.
+    float(transaction["amount"])
+    if not isinstance(transaction["category"], str):
+        raise ValueError("Category must be text")
+    if transaction["type"] not in TYPES:
+        raise ValueError(f"Type must be 'Income' or 'Expense', not {transaction['type']!r}")
+    date_to_ordinal(transaction["date"])
+
+
+def check_columns(columns):
+    # Column-wise validate_transaction for an extend_columns batch; returns
+    # the number of rows.
+    size = len(columns["amount"])
+    if any(len(columns[field]) != size for field in FIELDS):
+        raise ValueError("Columns must all have the same length")
+    array("d", columns["amount"])
+    if not all(isinstance(category, str) for category in set(columns["category"])):
+        raise ValueError("Category must be text")
+    unknown = set(columns["type"]) - set(TYPES)
+    if unknown:
+        raise ValueError(f"Type must be 'Income' or 'Expense', not {unknown.pop()!r}")
+    for date in set(columns["date"]):
+        date_to_ordinal(date)
+    return size
+
+
+def _map_unique(parse, values):
+    # Types, dates and categories repeat heavily, so each distinct value is
+    # parsed once and the column is translated through a dict. Returns the
+    # parsed column and whether any value failed to parse; a list the parse
+    # leaves as it is, the common case for clean files, comes back unchanged.
+    try:
+        table = {value: parse(value) for value in set(values)}
+    except TypeError:
+        parsed = [parse(value) for value in values]
+        return parsed, None in parsed
+    if all(type(value) is type(parsed) and value == parsed for value, parsed in table.items()):
+        return (values if type(values) is list else list(values)), False
+    return list(map(table.__getitem__, values)), None in table.values()
+
+
+def _canonical_date(value):
+    ordinal = _date(value)
+    return None if ordinal is None else ordinal_to_date(ordinal)
+
+
+def _parse_amount_chunk(values):
+    # Whole-chunk fast paths: text is checked with one scan over the joined
+    # chunk, and numeric JSON goes straight into an array. A chunk with a bad
+    # value falls back to parsing row by row.
+    try:
+        text = "\n".join(values)
+    except TypeError:
+        if set(map(type, values)) <= {float, int}:
+            amounts = array("d", values)
+            total = sum(amounts)
+            if total == total and total < INFINITY and min(amounts) >= 0:
+                return amounts
+    else:
+        if AMOUNT_CHARACTERS.fullmatch(text):
+            try:
+                return array("d", map(float, values))
+            except ValueError:
+                pass
+    return list(map(_amount, values))
+
+
+def _parse_amounts(values):
+    # An array when every chunk took a fast path, else a list with None for
+    # the bad amounts.
+    chunks = [_parse_amount_chunk(values[start:start + AMOUNT_CHUNK_SIZE])
+              for start in range(0, len(values), AMOUNT_CHUNK_SIZE)]
+    if all(type(chunk) is array for chunk in chunks):
+        parsed = array("d")
+        for chunk in chunks:
+            parsed.extend(chunk)
+        return parsed
+    return list(chain.from_iterable(chunks))
+
+
+def _missing(column):
+    return [position for position, value in enumerate(column) if value is None]
+
+
+def _describe(field, value):
+    if value is NOT_AN_OBJECT:
+        return "row is not an object"
+    if value is None:
+        return f"missing {field}"
+    return f"invalid {field} {value!r}"
+
+
+# Validates raw columns of equal length. Returns (columns, errors): columns
+# maps each field to the values of the valid rows, amounts as an array, and
+# errors holds (position, message) for every rejected row. A clean column may
+# be handed back as the same list that was passed in.
+def validate_columns(amounts, categories, types, dates):
+    parsed_amounts = _parse_amounts(amounts)
+    parsed_types, bad_types = _map_unique(_type, types)
+    parsed_dates, bad_dates = _map_unique(_canonical_date, dates)
+    parsed_categories, _ = _map_unique(_category, categories)
+    bad_amounts = type(parsed_amounts) is not array and None in parsed_amounts
+
+    problems = {}
+    for parsed, raw, field, bad in ((parsed_amounts, amounts, "amount", bad_amounts),
+                                    (parsed_types, types, "type", bad_types),
+                                    (parsed_dates, dates, "date", bad_dates)):
+        for position in _missing(parsed) if bad else ():
+            problems.setdefault(position, []).append(_describe(field, raw[position]))
+    errors = [(position, ", ".join(dict.fromkeys(problems[position]))) for position in sorted(problems)]
+    if errors:
+        valid = bytearray(b"\x01") * len(parsed_types)
+        for position in problems:
+            valid[position] = 0
+        parsed_amounts = list(compress(parsed_amounts, valid))
+        parsed_types = list(compress(parsed_types, valid))
+        parsed_dates = list(compress(parsed_dates, valid))
+        parsed_categories = list(compress(parsed_categories, valid))
+
+    columns = {
+        "amount": array("d", parsed_amounts),
+        "category": parsed_categories,
+        "type": parsed_types,
+        "date": parsed_dates,
+    }
+    return columns, errors
+
+
+# Splits raw rows into one list per field, ready for validate_columns.
+def row_columns(rows):
+    if not all(type(row) is dict for row in rows):
+        rows = [row if isinstance(row, dict) else NOT_AN_OBJECT_ROW for row in rows]
+    try:
+        return [list(map(itemgetter(field), rows)) for field in FIELDS]
+    except KeyError:
+        return [[row.get(field) for row in rows] for field in FIELDS]
+
+
+# Batched counterpart of normalize_transaction for a list of raw rows.
+def validate_rows(rows):
+    columns, errors = validate_columns(*row_columns(rows))
+    transactions = [{"amount": amount, "category": category, "type": type_, "date": date}
+                    for amount, category, type_, date in
+                    zip(columns["amount"], columns["category"], columns["type"], columns["date"])]
+    return transactions, errors